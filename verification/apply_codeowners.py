@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+""" assign the team of the issues from the owners in a CODEOWNERS file
+"""
+
+import traceback
+import sys
+import os
+import re
+import posixpath
+import gitignore_parser
+import util
+from util import Column
+from util import eprint
+
+
+def show_usage():
+    if len(sys.argv) > 1:
+        eprint("  I got:", sys.argv)
+        eprint("")
+    eprint("Usage: <input> | " + os.path.basename(__file__) + " <CODEOWNERS> [<root>]")
+    eprint("   " + __doc__)
+    eprint("   <root> is the root of the repository the file paths of the issues are relative to, defaults to the directory")
+    eprint("          of the CODEOWNERS file (or its parent for .github/CODEOWNERS and docs/CODEOWNERS)")
+    eprint("   issues of files without owners keep their team")
+    eprint("   --format=bin writes the issues in the binary format instead of text")
+
+
+class CodeOwners:
+    """
+    The '<pattern> <owner>...' lines of a CODEOWNERS file, the last line whose pattern matches a file gives its owners.
+    The patterns are gitignore patterns, compiled by gitignore_parser.CompiledRules, and a pattern that matches
+    a directory also matches the files below it (except 'dir/*', that only matches the files directly in dir).
+    The match is remembered per directory, so a file in a known directory only checks the patterns on its name,
+    and the owners are remembered per file, so both caches are limited by the size of the repository.
+    """
+
+    def __init__(self, filename, root):
+        self.root = os.path.abspath(root).replace("\\", "/")
+        self.owners = {}        # line number: owners
+        file_rules = []
+        directory_rules = []
+        with open(filename, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                parts = re.split(r"\s#", line, maxsplit=1)[0].split()
+                if len(parts) == 0 or parts[0].startswith("#"):
+                    continue
+                pattern = parts[0].replace("\\#", "#")
+                rule = gitignore_parser.rule_from_pattern(pattern, source=(filename, number))
+                if rule is None or rule.negation:
+                    eprint(f"{filename}:{number}: ignoring unsupported pattern: {pattern}")
+                    continue
+                self.owners[number] = " ".join(parts[1:])
+                file_rules.append(rule)
+                if not pattern.endswith("/*"):
+                    directory_rules.append(rule)
+        self.file_rules = gitignore_parser.CompiledRules(file_rules)
+        self.directory_rules = gitignore_parser.CompiledRules(directory_rules)
+        self.directories = {"": 0}  # relative directory: line number of the last match of it or a parent, 0 for none
+        self.files = {}         # filename: owners
+
+    # the path relative to the root with / separators, None for a path outside of the root
+    def get_relative_path(self, filename):
+        path = posixpath.normpath(filename.replace("\\", "/"))
+        if path.startswith("/") or path[1:3] == ":/":
+            if not path.startswith(self.root + "/"):
+                return None
+            path = path[len(self.root) + 1:]
+        if path.startswith("../"):
+            return None
+        return path
+
+    def get_directory_match(self, directory):
+        number = self.directories.get(directory)
+        if number is None:
+            number = self.get_directory_match(posixpath.dirname(directory))
+            rule = self.directory_rules.last_match(directory.replace("/", os.sep), True)
+            if rule is not None:
+                number = max(number, rule.source[1])
+            self.directories[directory] = number
+        return number
+
+    # returns the owners of the file (a fileref or filename), None when it has no owners
+    def lookup(self, file):
+        filename = util.split_fileref(file)[0]
+        owners = self.files.get(filename, "")
+        if owners == "":
+            owners = self.files[filename] = self.find(filename)
+        return owners
+
+    def find(self, filename):
+        path = self.get_relative_path(filename)
+        if path is None or path == ".":
+            number = 0
+        else:
+            number = self.get_directory_match(posixpath.dirname(path))
+            rule = self.file_rules.last_match(path.replace("/", os.sep), False)
+            if rule is not None:
+                number = max(number, rule.source[1])
+        return self.owners.get(number) or None
+
+
+def get_default_root(filename):
+    directory = os.path.dirname(os.path.abspath(filename))
+    if os.path.basename(directory) in [".github", "docs"]:
+        return os.path.dirname(directory)
+    return directory
+
+
+# assigns the team of the issue, the owners of its file in the CODEOWNERS file
+def transform(line, codeowners):
+    owners = codeowners.lookup(line[Column.FILE])
+    if owners is not None:
+        line[Column.TEAM] = owners
+    return line
+
+
+def main():
+    util.apply_format_argument()
+    if len(sys.argv) not in [2, 3]:
+        eprint(os.path.basename(__file__) + " commandline error: invalid argument(s)\n")
+        show_usage()
+        sys.exit(1)
+
+    filename = sys.argv[1]
+    root = sys.argv[2] if len(sys.argv) == 3 else get_default_root(filename)
+    codeowners = CodeOwners(filename, root)
+
+    # one issue at a time, so the memory use does not depend on the size of the input
+    for line in util.read_issues():
+        util.report_list(transform(line, codeowners))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        raise
+    except SystemExit:
+        raise
+    except BrokenPipeError:   # still makes piping into 'head -n' work nicely
+        sys.exit(0)
+    except:
+        info = traceback.format_exc()
+        eprint(info)
+        show_usage()
+        sys.exit(1)
@@ -12,10 +12,7 @@ from util import eprint
 low_hanging_issue_count_treshold = 20
 
 def read():
-    results = []
-    for line in sys.stdin:
-        results += [util.read_structured_line(line)]
-    return results
+    return list(util.read_issues())
 
 
 def count_rules(lines):
@@ -29,33 +26,39 @@ def count_rules(lines):
     return results
 
 
+def apply_low_hanging_fruit(lines):
+    rules = count_rules(lines)
+    rule_set = set()
+    for rule in rules:
+        count = rules[rule]
+        if count <= low_hanging_issue_count_treshold:
+            rule_set.add(rule)
+
+    for line in lines:
+        rule = line[Column.RULE]
+        if rule in rule_set:
+            line[Column.PRIO] = str(Priority.LOW_HANGING.value)
+            line[Column.DESCRIPTION] = "[LOW] " + line[Column.DESCRIPTION]
+    return lines
+
+
 def show_usage():
     if len(sys.argv) > 1:
         eprint("  I got:", sys.argv)
         eprint("")
     eprint("Usage: <input> | " + os.path.basename(__file__))
     eprint(f"   re-prioritize rules that have less then {low_hanging_issue_count_treshold} issues to top-priority")
+    eprint("   --format=bin writes the issues in the binary format instead of text")
 
 
 def main():
+    util.apply_format_argument()
     if len(sys.argv) != 1:
         eprint(os.path.basename(__file__) + " commandline error: invalid argument(s)\n")
         show_usage()
         sys.exit(1)
 
-    lines = read()
-    rules = count_rules(lines)
-    rule_set = set()
-    for rule in rules:
-        count = rules[rule]
-        if count <= low_hanging_issue_count_treshold:
-            rule_set.add(rule)
-
-    for line in lines:
-        rule = line[Column.RULE]
-        if rule in rule_set:
-            line[Column.PRIO] = str(Priority.LOW_HANGING.value)
-            line[Column.DESCRIPTION] = "[LOW] " + line[Column.DESCRIPTION]
+    for line in apply_low_hanging_fruit(read()):
         util.report_list(line)
 
 
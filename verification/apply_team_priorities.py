@@ -15,149 +15,43 @@ def show_usage():
         eprint("")
     eprint("Usage: <input> | " + os.path.basename(__file__))
     eprint("   " + __doc__)
+    eprint("   --format=bin writes the issues in the binary format instead of text")
 
 
-def read():
-    results = []
-    for line in sys.stdin:
-        results += [read_structured_line(line)]
-    return results
+# the priorities and categories per rule, see team_priorities.txt
+priority_table = None
+unassigned_priority = str(Priority.UNASSIGNED.value)
 
 
-def get_priority(rule):
+def get_priority_table():
+    global priority_table
+    if priority_table is None:
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "team_priorities.txt")
+        priority_table = util.RuleTable(filename, ("priority", "category"))
+    return priority_table
+
 
-    # MSVC warnings
-    if "C4701" == rule: #ub, Potentially uninitialized local variable
-        return 5
-
-    # gcc warnings, exact matches if possible, some contains trailing =
-    # for example `implicit-fallthrough=`, `format-overflow=`, `stringop-overflow=` or `format-truncation=`
-    if "aggressive-loop-optimizations" == rule:  # ub
-        return 5
-    if "array-bounds" == rule:
-        return 5
-    if "literal-conversion" == rule:
-        return 5
-    if "restrict" == rule:
-        return 5
-    if "stringop-overflow=" == rule:
-        return 5
-    if "varargs" == rule:  # ub
-        return 5
-    if "overloaded-virtual" == rule:
-        return 5
-    if "self-assign" == rule:
-        return 5
-    if "gnu-zero-variadic-macro-arguments" == rule:
-        return 10
-    if "ignored-qualifiers" == rule:
-        return 10
-    if "stringop-truncation" == rule:  # ub
-        return 10
-    if "unused-value" == rule:
-        return 10
-    if "main" == rule:
-        return 10
-    if "comment" in rule:
-        return 10
-    if "pointer-bool-conversion" in rule:
-        return 10
-    if "implicit-fallthrough" in rule:
-        return 20
-    if "uninitialized" == rule:
-        return 25
-    if "self-assign" in rule:
-        return 30
-    if "maybe-uninitialized" in rule:
-        return 40
-    if "unused-" in rule:
-        return 40
-    if "format-overflow" in rule:
-        return 45
-    if "missing-field-initializers" in rule:
-        return 45
-    if "sign-compare" in rule:
-        return 45
-    if "write-strings" in rule:
-        return 50
-    if "format-y2k" == rule:
-        return 60
-    if "vla" == rule:
-        return 60
-    if "ignored-qualifiers" in rule:
-        return 60
-    if "format-nonliteral" == rule:
-        return 70
-    if "format-truncation" == rule:
-        return 80
-    if "format-nonliteral" in rule:
-        return 80
-    if "overflow" in rule:
-        return 80
-
-    # open canary issues
-
-    if "MO#1" == rule:  # /make_unique
-        return 70
-    if "MO#2" == rule:  # make_unique
-        return 70
-    if "AP#3" == rule:  # reinterpret_cast
-        return 35
-    if "AP#4" == rule:  # volatile
-        return 15
-    if "MO#5" == rule:  # nullptr
-        return 85
-    if "AP#6" == rule:  # non-english words
-        return 65
-    if "AP#7" == rule:  # ifdef
-        return 80
-    if "AP#8" == rule:  # c-style-cast
-        return 40
-    if "AP#9" == rule:  # c-style-cast
-        return 75
-    if "AP#10" == rule:
-        return 70
-    if "AP#11" == rule:
-        return 60
-    if "AP#12" == rule:  # ??
-        return 99
-    if "AP#13" == rule:  # delete
-        return 45
-    if "AP#14" == rule:  # c-style-cast
-        return 15
-    if "AP#15" == rule:  # casting literals
-        return 30
-    if "AP#16" == rule:  # const_cast
-        return 30
-
-    return Priority.UNASSIGNED.value
+def get_priority(rule):
+    priority = get_priority_table().lookup(rule)[0]
+    if priority is None:
+        return Priority.UNASSIGNED.value
+    return int(priority)
 
 
 def get_category(line):
-    rule = line[Column.RULE]
-    if "aggressive-loop-optimizations" == rule:
-        return "ub"
-    if "stringop-truncation" in rule:
-        return "ub"
-    if "varargs" in rule:
-        return "ub"
-    if "array-bounds" in rule:
-        return "ub"
-    return line[Column.CATEGORY]
-
-
-# move into team-specific script that also fills in the category field
-# guideline for priotity:
-# - likeliness to be an actual bug means higher priority
-# - below 10: solve immediately, likely currently causing problems
-# - 11-50: likely a bug
-# - 51-75: probably not causing active problems, but just the wrong way to do it
-# - 75-99: hard to read / old style / bad style
+    category = get_priority_table().lookup(line[Column.RULE])[1]
+    if category is None:
+        return line[Column.CATEGORY]
+    return category
+
+
+# assigns the priority and category of the issue, as configured in team_priorities.txt
 def transform(line):
     try:
-        rule = line[Column.RULE]
-        line[Column.PRIO] = str(get_priority(rule))
-        line[Column.CATEGORY] = get_category(line)
+        priority, category = get_priority_table().lookup(line[Column.RULE])
+        line[Column.PRIO] = unassigned_priority if priority is None else priority
+        if category is not None:
+            line[Column.CATEGORY] = category
     except Exception:
         eprint("Exception in transform of:", line)
         raise
@@ -165,12 +59,14 @@ def transform(line):
 
 
 def main():
+    util.apply_format_argument()
     if len(sys.argv) != 1:
         eprint(os.path.basename(__file__) + " commandline error: invalid argument(s)\n")
         show_usage()
         sys.exit(1)
 
-    for line in read():
+    # one issue at a time, so the memory use does not depend on the size of the input
+    for line in util.read_issues():
         util.report_list(transform(line))
 
 
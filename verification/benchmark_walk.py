@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Benchmarks gitignore_parser.walk() on a synthetic directory tree
+- creates a tree of --directories directories (100000 by default), every directory contains two files
+- every tenth directory has an .opencanaryignore file, so the rules are inherited over many levels
+- prints the time of a plain os.walk(), gitignore_parser.walk() and walk_parallel() over the same tree
+
+"""
+
+import traceback
+import sys
+import os
+import time
+import argparse
+import tempfile
+import gitignore_parser
+
+from util import eprint
+
+
+def create_tree(path, directories, fanout):
+    created = 0
+    pending = [path]
+    while pending and created < directories:
+        parent = pending.pop(0)
+        for index in range(fanout):
+            if created == directories:
+                break
+            directory = os.path.join(parent, f"d{index}")
+            os.mkdir(directory)
+            for filename in ["source.cpp", "header.h"]:
+                with open(os.path.join(directory, filename), "w") as f:
+                    f.write("")
+            if created % 10 == 0:
+                with open(os.path.join(directory, ".opencanaryignore"), "w") as f:
+                    f.write(f"*.o\nbuild/\n!keep{created}.h\nd{created % fanout}/header.h\n")
+            pending.append(directory)
+            created += 1
+
+
+def time_walk(walk):
+    start = time.perf_counter()
+    directories = 0
+    files = 0
+    for _root, dirs, filenames in walk():
+        directories += len(dirs)
+        files += len(filenames)
+    return time.perf_counter() - start, directories, files
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmarks gitignore_parser.walk() on a synthetic directory tree")
+    parser.add_argument('--directories', metavar="N", type=int, default=100000,
+                        help="number of directories in the synthetic tree, defaults to 100000")
+    parser.add_argument('--fanout', metavar="N", type=int, default=8,
+                        help="number of subdirectories per directory, defaults to 8")
+    parser.add_argument('--path', default="",
+                        help="create the tree in this (empty) directory and keep it, by default a temporary directory is used")
+    return parser.parse_args()
+
+
+def run(args, path):
+    eprint("creating", args.directories, "directories in", path)
+    start = time.perf_counter()
+    create_tree(path, args.directories, args.fanout)
+    eprint(f"created in {time.perf_counter() - start:.2f}s")
+
+    seconds, directories, files = time_walk(lambda: os.walk(path))
+    print(f"os.walk:               {seconds:8.2f}s {directories} directories {files} files")
+    seconds, directories, files = time_walk(lambda: gitignore_parser.walk(path, filenames=['.opencanaryignore']))
+    print(f"gitignore_parser.walk: {seconds:8.2f}s {directories} directories {files} files")
+    seconds, directories, files = time_walk(lambda: gitignore_parser.walk_parallel(path, filenames=['.opencanaryignore']))
+    print(f"walk_parallel:         {seconds:8.2f}s {directories} directories {files} files")
+
+
+def main():
+    args = parse_arguments()
+    if args.path:
+        os.makedirs(args.path, exist_ok=True)
+        run(args, os.path.abspath(args.path))
+    else:
+        with tempfile.TemporaryDirectory() as path:
+            run(args, path)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except:
+        info = traceback.format_exc()
+        eprint(info)
+        sys.exit(1)
@@ -154,8 +154,8 @@ def get_link_map(parts):
     return zip(parts, links)
 
 
-def create_html_report(lines, count):
-    display_lines = lines[:count]
+def get_html_report(issues, count):
+    display_issues = issues[:count]
 
     html_content = r'''<!DOCTYPE html><html lang="en">
 {styles}
@@ -182,9 +182,8 @@ Listing {display_count} out of {total_count} issues.
     td = '<td><div>'
     tdend = '</div></td>\n'
 
-    for line in display_lines:
+    for parts in display_issues:
         html_content += '<tr>'
-        parts = util.read_structured_line(line)
         link_map = get_link_map(parts)
 
         for value, link in link_map:
@@ -196,13 +195,31 @@ Listing {display_count} out of {total_count} issues.
 
     html_content += '</table>\n{script_section}\n</body></html>\n'
 
-    sys.stdout.write(html_content.format(
+    return html_content.format(
         styles=get_html_styles(),
-        issue_count=str(len(lines)) + ' issues were found relevant for this Software Quality Report (SQR)',
-        display_count=len(display_lines),
-        total_count=len(lines),
+        issue_count=str(len(issues)) + ' issues were found relevant for this Software Quality Report (SQR)',
+        display_count=len(display_issues),
+        total_count=len(issues),
         script_section=get_script_section()
-    ))
+    )
+
+
+# 'limit' is the maximum number of issues listed, 0 lists all issues
+def create_html_report(issues, limit):
+    if limit == 0:
+        return get_html_report(issues, len(issues))
+    return get_html_report(issues, limit)
+
+
+# returns the /limit=N argument, 0 without an argument or None when the arguments are invalid
+def parse_limit(args):
+    if len(args) == 0:
+        return 0
+    if len(args) == 1 and "/limit=" in args[0].lower():
+        limit = int(args[0].split("=")[1])
+        if limit != 0:
+            return limit
+    return None
 
 
 def show_usage():
@@ -219,25 +236,16 @@ def show_usage():
 
 def main():
 
-    limit = 0
-
-    if len(sys.argv) == 2 and "/limit=" in sys.argv[1].lower():
-        limit = int(sys.argv[1].split("=")[1])
-
-    if len(sys.argv) != 1 and limit == 0:
+    limit = parse_limit(sys.argv[1:])
+    if limit is None:
         eprint(os.path.basename(__file__) +
                " commandline error: invalid argument(s)\n")
         show_usage()
         sys.exit(1)
 
-    issues = []
-    for raw in sys.stdin:
-        issues += [raw]
+    issues = list(util.read_issues())
 
-    if limit == 0:
-        create_html_report(issues, len(issues))
-    else:
-        create_html_report(issues, limit)
+    sys.stdout.write(create_html_report(issues, limit))
 
 
 if __name__ == "__main__":
@@ -3,8 +3,10 @@
 """
 
 import os
+import sys
 import fnmatch
 import argparse
+import util
 
 def match(line, includefilter, excludefilter):
     for keyword in excludefilter:
@@ -18,6 +20,30 @@ def match(line, includefilter, excludefilter):
     return False
 
 
+# yields the matching lines of the input files one at a time, '-' reads stdin
+def filter_lines(args, includefilter, excludefilter):
+    for inputfile in args.input:
+        if inputfile == "-":
+            yield from filter_file(sys.stdin, args, includefilter, excludefilter)
+            continue
+        with open(inputfile, encoding="utf-8") as f:
+            yield from filter_file(f, args, includefilter, excludefilter)
+
+
+def filter_file(f, args, includefilter, excludefilter):
+    for line in f:
+        if args.column:
+            matchtext = line.strip().split(args.separator)[args.column]
+        else:
+            matchtext = line.strip()
+        if args.ignorecase:
+            if match(matchtext.lower(), includefilter, excludefilter):
+                yield line
+        else:
+            if match(matchtext, includefilter, excludefilter):
+                yield line
+
+
 def lower_list(list_value):
     result = []
     for entry in list_value:
@@ -49,7 +75,7 @@ def list_by_wildcard(wildcard):
 def main():
 
     parser = argparse.ArgumentParser(description='Filter CSV files')
-    parser.add_argument('-i', '--input', required=True, action='append', help="file(s) to use as input")
+    parser.add_argument('-i', '--input', required=True, action='append', help="file(s) to use as input, - reads stdin")
     parser.add_argument('-s', '--separator', default='|', help="character used as separator, defaults to a pipe symbol ( | )")
     parser.add_argument('-c', '--column', type=int, help="restrict matching to column N, first column is 0")
     parser.add_argument('-ic', '--ignorecase', action='store_true', help="case-insensitive match")
@@ -71,30 +97,19 @@ def main():
         includefilter = lower_list(includefilter)
         excludefilter = lower_list(excludefilter)
 
-    lines = []
-    for inputfile in args.input:
-        with open(inputfile, encoding="utf-8") as f:
-            for line in f:
-                if args.column:
-                    matchtext = line.strip().split(args.separator)[args.column]
-                else:
-                    matchtext = line.strip()
-                if args.ignorecase:
-                    if match(matchtext.lower(), includefilter, excludefilter):
-                        lines += [line]
-                else:
-                    if match(matchtext, includefilter, excludefilter):
-                        lines += [line]
-
+    # the lines are written as they are found, so the memory use does not depend on the size of the input
+    count = 0
     if useconsole:
-        for line in lines:
-            print(line,)
+        for line in filter_lines(args, includefilter, excludefilter):
+            util.write_text_line(line)
+            count += 1
     else:
         with open(args.outputfile, 'w') as f:
-            for line in lines:
+            for line in filter_lines(args, includefilter, excludefilter):
                 f.write(line)
+                count += 1
 
-    print(len(lines), " lines.")
+    util.sprint(count, " lines.")
 
 
 if __name__ == '__main__':
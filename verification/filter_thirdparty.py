@@ -3,41 +3,51 @@
 """
 
 import traceback, sys, os
+import util
 from util import *
+from issue_filter import IssueFilter
 
-def filter(line):
-    if "external/" in line:
-        return
-    sys.stdout.write(line)
+# the issues from third party code, see issue_filter.py for the syntax
+thirdparty = [
+    'file contains external/',
+]
 
+# the issues from third party code and the MSVC system headers, matched case-insensitive on the normalized paths
+thirdparty_msvc = [
+    'file matches "(?i)external/|/msvc/"',
+    'file matches "(?i)^[^/]*/sdk/"',
+]
 
-def filter_and_normalize_msvc(line):
-    result = line.replace('\\', '/')
-    result_lower = result.lower()
-    if "external/" in result_lower:
-        return
-    if "/msvc/" in result_lower:
-        return
-    if "/sdk/" in result_lower[:20]:
-        return
-    sys.stdout.write(result)
+
+def filter(issues):
+    issue_filter = IssueFilter(thirdparty)
+    for parts in issues:
+        if not issue_filter.matches(parts):
+            util.write_written_fields(parts)
+
+
+def filter_and_normalize_msvc(issues):
+    issue_filter = IssueFilter(thirdparty_msvc)
+    for parts in issues:
+        parts = [part.replace('\\', '/') for part in parts]
+        if not issue_filter.matches(parts):
+            util.write_written_fields(parts)
 
 
 def show_usage():
-    eprint("Usage: " + os.path.basename(__file__) + " [/msvc]")
+    eprint("Usage: " + os.path.basename(__file__) + " [/msvc] [--format=bin]")
     eprint("   will filter all lines from 3rd party as hardcoded by you in this script")
     eprint(r"   /msvc  - also ignore messages from MSVC system headers and normalize paths, replacing \ with /")
 
 
 def main():
+    util.apply_format_argument()
     if len(sys.argv) < 2:
-        for line in sys.stdin:
-            filter(line)
+        filter(util.read_written_fields())
         sys.exit(0)
 
     if len(sys.argv) == 2 and sys.argv[1] == "/msvc":
-        for line in sys.stdin:
-            filter_and_normalize_msvc(line)
+        filter_and_normalize_msvc(util.read_written_fields())
         sys.exit(0)
 
     eprint("error: invalid argument(s)\n")
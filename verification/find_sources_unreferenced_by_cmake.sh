@@ -2,10 +2,13 @@
 # this script finds unique words in source code
 # it can be used to discover dead code and/or unused defines
 
+# the files come from the inventory (see inventory.py), so the .opencanaryignore files are obeyed
+INVENTORY="python3 $(dirname "$0")/inventory.py"
+
 echo "Collecting files... *.h, *.cc, *.c"
-find . -name "*.h" -o -name "*.cc" -o -name "*.c" > /tmp/files_on_disk.txt
+$INVENTORY list . --extension .h .cc .c > /tmp/files_on_disk.txt
 
-cat `find . -name CMakeLists.txt` | grep -E "\.cc|\.c|\.h" > /tmp/referenced_sources.txt
+$INVENTORY list . --kind cmake -0 | xargs -0 cat | grep -E "\.cc|\.c|\.h" > /tmp/referenced_sources.txt
 
 # Extract words from input file, sort and get unique words
 cat /tmp/files_on_disk.txt | tr -cs '[:alnum:]_.' '[\n*]' | sort | uniq > /tmp/input_words.txt
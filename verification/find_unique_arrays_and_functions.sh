@@ -2,10 +2,13 @@
 # this script finds unique words in source code
 # it can be used to discover dead code and/or unused defines
 
+# the files come from the inventory (see inventory.py), so the .opencanaryignore files are obeyed
+INVENTORY="python3 $(dirname "$0")/inventory.py"
+
 echo "Collecting files... *.h, *.cc, *.c"
-find . -name "*.h" -exec cat {} \; > /tmp/bigfile
-find . -name "*.cc" -exec cat {} \; >> /tmp/bigfile
-find . -name "*.c" -exec cat {} \; >> /tmp/bigfile
+$INVENTORY list . --extension .h -0 | xargs -0 cat > /tmp/bigfile
+$INVENTORY list . --extension .cc -0 | xargs -0 cat >> /tmp/bigfile
+$INVENTORY list . --extension .c -0 | xargs -0 cat >> /tmp/bigfile
 grep -o -E '[a-zA-Z_]{4,}' /tmp/bigfile | sort > /tmp/wordfile
 
 LINES=`cat /tmp/bigfile | wc -l`
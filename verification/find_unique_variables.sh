@@ -2,8 +2,11 @@
 # this script finds unique words in source code
 # it can be used to discover dead code and/or unused variables
 
+# the files come from the inventory (see inventory.py), so the .opencanaryignore files are obeyed
+INVENTORY="python3 $(dirname "$0")/inventory.py"
+
 echo "Collecting files... *.h, *.cc, *.c"
-cat `find . -name "*.h" -o -name "*.cc" -o -name "*.c"` > /tmp/bigfile
+$INVENTORY list . --extension .h .cc .c -0 | xargs -0 cat > /tmp/bigfile
 
 # build a sorted list of all words with 4 or more letters, \w matches [A-Za-z0-9_]
 grep -o -E '\w{4,}' /tmp/bigfile | sort > /tmp/wordfile
@@ -15,6 +15,8 @@ if sys.hexversion < 0x03040000:
     sys.exit("Python 3.4 or newer is required to run this program, you are running " + ".".join(map(str, sys.version_info)))
 
 import collections
+import concurrent.futures
+import functools
 import itertools
 import os
 import re
@@ -63,6 +65,75 @@ def walk(directory, onerror=None, filenames=['.gitignore'],
     top-down, while obeying the rules of .gitignore. Links will not
     be followed.
     """
+    return _filtered_walk(_walk(directory, onerror=onerror), directory,
+                          filenames, overrides, ignore_completely)
+
+
+def walk_parallel(directory, onerror=None, filenames=['.gitignore'],
+                  overrides=None, ignore_completely=None, threads=None):
+    """
+    Same as walk(), with the same results in the same order, but the
+    directories are listed with os.scandir() on a pool of 'threads'
+    threads. The subdirectories that are not ignored are listed
+    concurrently while the caller handles their parent.
+    """
+    return _filtered_walk(scandir_walk(directory, onerror, threads), directory,
+                          filenames, overrides, ignore_completely)
+
+
+def list_directory(path):
+    """
+    Return the names of the subdirectories, of the other entries and of
+    the subdirectories that are symbolic links, like os.walk() sorts them.
+    """
+    dirs = []
+    files = []
+    links = set()
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry.name)
+                continue
+            dirs.append(entry.name)
+            try:
+                if entry.is_symlink():
+                    links.add(entry.name)
+            except OSError:
+                pass
+    return dirs, files, links
+
+
+def scandir_walk(top, onerror=None, threads=None):
+    """
+    A top-down os.walk() that does not follow links, the listing of a
+    directory is started as soon as its parent was yielded (and the caller
+    had the chance to remove it from dirs).
+    """
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        pending = [(top, executor.submit(list_directory, top))]
+        while pending:
+            root, listing = pending.pop()
+            try:
+                # a listing that no thread started yet is done right here
+                if listing.cancel():
+                    dirs, files, links = list_directory(root)
+                else:
+                    dirs, files, links = listing.result()
+            except OSError as error:
+                if onerror is not None:
+                    onerror(error)
+                continue
+            yield root, dirs, files
+            paths = [os.path.join(root, d) for d in dirs if d not in links]
+            children = [(path, executor.submit(list_directory, path)) for path in paths]
+            pending.extend(reversed(children))
+
+
+def _filtered_walk(tree, directory, filenames, overrides, ignore_completely):
     starting_directory = Path(os.path.abspath(directory))
 
     if not overrides:
@@ -85,62 +156,217 @@ def walk(directory, onerror=None, filenames=['.gitignore'],
         raise ValueError('negation rules are not allowed in the '
                          'ignore completely rules')
 
-    # Rule list will be a dict, keyed by directory with each value a
-    # possibly-empty list of IgnoreRules
-    rule_list = {}
-    while True:
-        for root, dirs, files in _walk(directory, onerror=onerror):
+    # overrides and ignore-completely patterns are always applicable
+    always_applicable = overrides + ignore_completely
+
+    # The rules of a directory are the rules it inherits from its parent,
+    # followed by the rules of its own ignore files. They are computed once
+    # and handed down to the subdirectories that are not ignored.
+    inherited_rules = {}
+    for root, dirs, files in tree:
+        current_dir = os.path.abspath(root)
+        rules = []
+        for filename in filenames:
+            if filename in files:
+                rules.extend(rules_from_file(filename, current_dir))
+        rule_stack = inherited_rules.pop(current_dir, CompiledRules([])).extended(rules)
+        matcher = rule_stack.extended(always_applicable)
+        dirs[:] = [d for d in dirs
+                   if matcher.is_included(os.path.join(current_dir, d), is_dir=True)]
+        files[:] = [f for f in files
+                    if matcher.is_included(os.path.join(current_dir, f), is_dir=False)]
+        yield root, dirs, files
+        # the caller may have removed directories from dirs as well
+        for d in dirs:
+            inherited_rules[os.path.join(current_dir, d)] = rule_stack
+
+
+class CompiledRules(object):
+    """
+    An ordered list of IgnoreRules, compiled for matching many paths. The
+    consecutive rules that share a base_path are combined into one regex
+    (one for files and one for directories). Its alternatives are the rules
+    in reverse order, so the first alternative that matches is the last
+    matching rule.
+    """
+
+    def __init__(self, rules):
+        self.groups = []
+        for base_path, group in itertools.groupby(rules, key=lambda rule: rule.base_path):
+            # the last item holds the RuleGroup for files and directories once it is compiled,
+            # it is shared with the CompiledRules that extend this one
+            self.groups.append((base_path, str(base_path) if base_path else None, tuple(group), {}))
+
+    def extended(self, rules):
+        """
+        Return the CompiledRules of these rules followed by 'rules'.
+        """
+        result = CompiledRules([])
+        result.groups = self.groups + CompiledRules(rules).groups
+        return result
+
+    def last_match(self, abs_path, is_dir):
+        """
+        Return the last rule that matches abs_path, or None.
+        """
+        for base_path, base_string, rules, compiled in reversed(self.groups):
+            group = compiled.get(is_dir)
+            if group is None:
+                group = compiled[is_dir] = compile_rule_group(rules, is_dir)
+            if not group.candidates:
+                continue
+            rule = group.last_match(relative_path(abs_path, base_path, base_string))
+            if rule:
+                return rule
+        return None
+
+    def is_included(self, abs_path, is_dir):
+        """
+        Return whether abs_path is not ignored, the last matching rule decides.
+        """
+        rule = self.last_match(abs_path, is_dir)
+        return rule is None or rule.negation
+
+
+def relative_path(abs_path, base_path, base_string):
+    """
+    The path that the rules of base_path are matched against, the same
+    string IgnoreRule.match() uses, without pathlib for normalized paths.
+    """
+    if abs_path == os.path.normpath(abs_path):
+        if base_path is None:
+            return abs_path
+        prefix = base_string if base_string.endswith(os_sep) else base_string + os_sep
+        if abs_path.startswith(prefix) and len(abs_path) > len(prefix):
+            return abs_path[len(prefix):]
+    if base_path:
+        rel_path = str(Path(abs_path).relative_to(base_path))
+    else:
+        rel_path = str(Path(abs_path))
+    if rel_path.startswith('./'):
+        rel_path = rel_path[2:]
+    return rel_path
+
+
+@functools.lru_cache(maxsize=None)
+def compile_rule_group(rules, is_dir):
+    return RuleGroup(rules, is_dir)
+
+
+class RuleGroup(object):
+    """
+    Rules that share a base_path, compiled for matching relative paths,
+    directory-only rules are left out for files. The rules are numbered in
+    reverse order (candidates), so the lowest matching position is the last
+    matching rule. Rules that match a literal suffix (plain names and
+    '*.ext' patterns) are looked up in a set per suffix length, the others
+    are combined into one regex that fully matches a path when one of them
+    would match it (group n is at regex_positions[n - 1]).
+    """
+
+    def __init__(self, rules, is_dir):
+        self.candidates = [rule for rule in reversed(rules) if is_dir or not rule.directory_only]
+        suffixes = {}
+        self.regex_positions = []
+        for position, rule in enumerate(self.candidates):
+            if rule.suffix:
+                suffixes.setdefault(len(rule.suffix), {}).setdefault(rule.suffix, position)
+            else:
+                self.regex_positions.append(position)
+        self.suffixes = sorted(suffixes.items())
+        self.regex = None
+        if self.regex_positions:
+            alternatives = ['({})'.format(fullmatch_body(self.candidates[position]))
+                            for position in self.regex_positions]
+            self.regex = compile_regex('(?ms)(?:' + '|'.join(alternatives) + ')')
+
+    def last_match(self, rel_path):
+        best = None
+        for length, suffixes in self.suffixes:
+            if length > len(rel_path):
+                break
+            position = suffixes.get(rel_path[-length:])
+            if position is not None and (best is None or position < best):
+                best = position
+        # the regex is only needed when one of its rules comes after the suffix match
+        if self.regex is not None and (best is None or self.regex_positions[0] < best):
+            match = self.regex.fullmatch(rel_path)
+            if match:
+                position = self.regex_positions[match.lastindex - 1]
+                if best is None or position < best:
+                    best = position
+        return None if best is None else self.candidates[best]
+
+
+# ignore files in different directories often contain the same patterns
+compile_regex = functools.lru_cache(maxsize=None)(re.compile)
+
+
+def fullmatch_body(rule):
+    """
+    Rewrite the search regex of a rule to one that fully matches the same
+    paths: an anchored rule matches from the start, an unanchored rule matches
+    any suffix of the path.
+    """
+    body = rule.regex[len('(?ms)'):-len(r'\Z')]
+    if rule.anchored:
+        return body[len('^'):]
+    return '.*' + body
+
+
+def filter_paths(directory, paths, filenames=['.gitignore'], ignore_completely=None):
+    """
+    Return the paths (relative to directory, or absolute) of the files that
+    walk() would yield, without walking the tree. The ignore files of every
+    directory from 'directory' down to the file are applied, a file inside an
+    ignored directory is ignored as well. The result contains absolute paths.
+    """
+    starting_directory = os.path.abspath(directory)
+    if ignore_completely is None:
+        ignore_completely = ['.git']
+    ignore_completely = [
+        rule_from_pattern(p, source=('application-level override', None))
+        for p in ignore_completely or []
+    ]
+
+    rules_per_directory = {}
+    matchers = {}
+
+    def get_rules(path):
+        if path not in rules_per_directory:
             rules = []
             for filename in filenames:
-                if filename in files:
-                    rules.extend(rules_from_file(filename, os.path.abspath(root)))
-            current_dir = Path(os.path.abspath(root))
-            rel_path = str(current_dir.relative_to(starting_directory))
-            rule_list[rel_path] = rules
-            # Now, make a list of rules, working our way back to the
-            # base directory.
-            applicable_rules = [rule_list[rel_path]]
-            if root != directory:
-                for p in Path(root).parents:
-                    rel_parent = str(p.relative_to(starting_directory))
-                    applicable_rules.append(rule_list[rel_parent])
-                    if p not in starting_directory.parents:
-                        break
-            applicable_rules.append(rule_list['.'])
-            # Our rules are actually ordered from the base down
-            applicable_rules = applicable_rules[::-1]
-            flat_list = list(
-                itertools.chain.from_iterable(applicable_rules)
-            )
-            # overrides and ignore-completely patterns are always applicable
-            flat_list.extend(overrides)
-            flat_list.extend(ignore_completely)
-            ignore = []
-            for d in dirs:
-                included = True
-                path = os.path.abspath(os.path.join(root, d))
-                for rule in flat_list:
-                    if included != rule.negation:
-                        if rule.match(path):
-                            included = not included
-                if not included:
-                    ignore.append(d)
-            dirs[:] = [d for d in dirs if d not in ignore]
-            ignore = []
-            for f in files:
-                included = True
-                path = os.path.join(root, f)
-                for rule in flat_list:
-                    if rule.directory_only:
-                        continue
-                    if included != rule.negation:
-                        if rule.match(os.path.abspath(path)):
-                            included = not included
-                if not included:
-                    ignore.append(f)
-            files[:] = [f for f in files if f not in ignore]
-            yield root, dirs, files
-        return
+                if os.path.isfile(os.path.join(path, filename)):
+                    rules.extend(rules_from_file(filename, path))
+            rules_per_directory[path] = rules
+        return rules_per_directory[path]
+
+    # the rules that apply to the entries of a directory only depend on the directory
+    def get_matcher(path, rules):
+        if path not in matchers:
+            matchers[path] = CompiledRules(rules + ignore_completely)
+        return matchers[path]
+
+    result = []
+    for path in paths:
+        abs_path = os.path.abspath(os.path.join(starting_directory, path))
+        rel_path = os.path.relpath(abs_path, starting_directory)
+        if rel_path == os.curdir or rel_path.startswith(os.pardir + os_sep) or rel_path == os.pardir:
+            continue
+
+        included = True
+        current_dir = starting_directory
+        rules = list(get_rules(current_dir))
+        for part in rel_path.split(os_sep)[:-1]:
+            parent_dir = current_dir
+            current_dir = os.path.join(current_dir, part)
+            if not get_matcher(parent_dir, rules).is_included(current_dir, is_dir=True):
+                included = False
+                break
+            rules.extend(get_rules(current_dir))
+        if included and get_matcher(current_dir, rules).is_included(abs_path, is_dir=False):
+            result.append(abs_path)
+    return result
 
 
 def rules_from_file(filename, base_path):
@@ -193,8 +419,8 @@ def rule_from_pattern(pattern, base_path=None, source=None):
                  pattern[start_index + 2] != '/')):
             return
 
-    # Special-casing '/', which doesn't match any files or directories
-    if pattern.rstrip() == '/':
+    # Special-casing '/' (and a lone '!'), which doesn't match any files or directories
+    if pattern.rstrip() in ('/', ''):
         return
 
     directory_only = pattern[-1] == '/'
@@ -203,16 +429,24 @@ def rule_from_pattern(pattern, base_path=None, source=None):
     anchored = '/' in pattern[:-1]
     if pattern[0] == '/':
         pattern = pattern[1:]
-    if pattern[0] == '*' and pattern[1] == '*':
+    if pattern[:2] == '**':
         pattern = pattern[2:]
         anchored = False
-    if pattern[0] == '/':
+    if pattern[:1] == '/':
         pattern = pattern[1:]
-    if pattern[-1] == '/':
+    if pattern[-1:] == '/':
         pattern = pattern[:-1]
     regex = fnmatch_pathname_to_regex(pattern)
+    # an unanchored plain name or '*' followed by a plain name matches every
+    # path that ends with that name, which needs no regex
+    suffix = None
+    if not anchored:
+        literal = pattern[1:] if pattern[:1] == '*' else pattern
+        if literal and not [c for c in '*?[/' if c in literal]:
+            suffix = literal
     if anchored:
-        regex = ''.join(['^', regex])
+        # the global flags must stay at the start of the expression (an error since python 3.11)
+        regex = regex.replace('(?ms)', '(?ms)^', 1)
     return IgnoreRule(
         pattern=orig_pattern,
         regex=regex,
@@ -220,7 +454,8 @@ def rule_from_pattern(pattern, base_path=None, source=None):
         directory_only=directory_only,
         anchored=anchored,
         base_path=Path(base_path) if base_path else None,
-        source=source
+        source=source,
+        suffix=suffix
     )
 
 
@@ -230,7 +465,8 @@ IGNORE_RULE_FIELDS = [
     'pattern', 'regex',  # Basic values
     'negation', 'directory_only', 'anchored',  # Behavior flags
     'base_path',  # Meaningful for gitignore-style behavior
-    'source'  # (file, line) tuple for reporting
+    'source',  # (file, line) tuple for reporting
+    'suffix'  # literal the path ends with, for plain name and '*.ext' rules
 ]
 
 
@@ -255,6 +491,10 @@ class IgnoreRule(collections.namedtuple('IgnoreRule_', IGNORE_RULE_FIELDS)):
             matched = True
         return matched
 
+
+IgnoreRule.__new__.__defaults__ = (None,)  # suffix
+
+
 def escaped_sep():
     if os_sep == "\\":
         return "\\\\"
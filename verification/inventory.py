@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Persistent inventory of the files in a source tree, shared by the tools that walk the tree
+- per file: size, mtime, content hash (headers, sources, projects and CMakeLists.txt only), kind and ignore status
+- the index is refreshed incrementally: only directories with a changed mtime are listed again,
+  only files with a changed size or mtime are hashed again
+- the ignore files are applied during the refresh like walk() does: ignored directories are not listed
+  and ignored files are not hashed
+- set OPENCANARY_INVENTORY to the index file to let util.get_files_from_directory() and the tools that use it share it
+
+usage: inventory.py [--index FILE] build <path> [--ignore-file NAME ...]
+       inventory.py [--index FILE] list <path> [--ignore-file NAME ...] [--extension EXT ...] [--kind KIND ...] [-0]
+
+"""
+
+import traceback
+import sys
+import os
+import json
+import hashlib
+import argparse
+import concurrent.futures
+import gitignore_parser
+import util
+
+from util import eprint
+
+# environment variable with the filename of the index
+INVENTORY_VARIABLE = "OPENCANARY_INVENTORY"
+
+# bump when the layout of the index changes, an index of another version is rebuilt
+INVENTORY_VERSION = 2
+
+# directories that are never part of the inventory, like walk() does by default
+ignore_completely = ['.git']
+
+
+def get_kind(filename):
+    if filename.endswith(".h") or filename.endswith(".hpp"):
+        return "header"
+    if filename.endswith(".cpp") or filename.endswith(".cc"):
+        return "source"
+    if filename.endswith("proj"):
+        return "project"
+    if os.path.basename(filename) == "CMakeLists.txt":
+        return "cmake"
+    return "other"
+
+
+def get_file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def scan_directory(path, previous):
+    """
+    Return the directory entry (mtime_ns, subdirectories and files) of path and the (size, mtime_ns) of its files.
+    The names are only listed again when the mtime of the directory changed since 'previous'.
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    if previous is not None and previous["mtime_ns"] == mtime_ns:
+        dirs = previous["dirs"]
+        files = previous["files"]
+    else:
+        dirs = []
+        files = []
+        # the same split as os.walk(): links to directories are not followed and not listed as files
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                    is_link = is_dir and entry.is_symlink()
+                except OSError:
+                    is_dir = is_link = False
+                if not is_dir:
+                    files.append(entry.name)
+                elif not is_link and entry.name not in ignore_completely:
+                    dirs.append(entry.name)
+    stats = {}
+    for name in files:
+        try:
+            stat = os.stat(os.path.join(path, name))
+            stats[name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+    return {"mtime_ns": mtime_ns, "dirs": dirs, "files": files}, stats
+
+
+class Inventory:
+    """
+    The files below 'root', stored as json in 'filename'. Paths in the index are relative to root.
+    """
+
+    def __init__(self, filename, root):
+        self.filename = filename
+        self.root = os.path.abspath(root)
+        self.directories = {}
+        self.files = {}
+        self.changed = False
+        if filename and os.path.isfile(filename):
+            try:
+                with open(filename, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INVENTORY_VERSION and data.get("root") == self.root:
+                    self.directories = data["directories"]
+                    self.files = data["files"]
+            except (ValueError, KeyError) as e:
+                eprint("ignoring unreadable inventory", filename, ":", e)
+
+    def refresh(self, ignore_files, threads=None):
+        """
+        Bring the index up to date with the tree and determine the ignore status of the files for 'ignore_files'
+        like walk() does: ignored directories are not listed and only the files that are not ignored are hashed.
+        The files are kept in the order walk() yields them. The entries below an ignored directory are kept for
+        other sets of ignore files, but they are not refreshed.
+        """
+        key = ",".join(ignore_files)
+        always_applicable = [gitignore_parser.rule_from_pattern(name, source=('application-level override', None))
+                             for name in ignore_completely]
+        directories = {}
+        files = {}
+        pruned = set()
+        changed_files = 0
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            def submit(relative_dir, rules):
+                path = os.path.join(self.root, relative_dir)
+                return relative_dir, rules, executor.submit(scan_directory, path, self.directories.get(relative_dir))
+
+            pending = [submit("", gitignore_parser.CompiledRules([]))]
+            while pending:
+                relative_dir, rules, scan = pending.pop()
+                try:
+                    entry, stats = scan.result()
+                except OSError:
+                    continue
+                directories[relative_dir] = entry
+                path = os.path.join(self.root, relative_dir)
+                # the rules of a directory are the rules of its parent, followed by the rules of its own ignore files
+                own_rules = []
+                for name in ignore_files:
+                    if name in stats:
+                        own_rules += gitignore_parser.rules_from_file(name, path)
+                rules = rules.extended(own_rules)
+                matcher = rules.extended(always_applicable)
+
+                for name in entry["files"]:
+                    if name not in stats:
+                        continue
+                    relative_path = os.path.join(relative_dir, name)
+                    size, mtime_ns = stats[name]
+                    record = self.files.get(relative_path)
+                    if record is None or record["size"] != size or record["mtime_ns"] != mtime_ns:
+                        record = {"size": size, "mtime_ns": mtime_ns, "sha1": None, "kind": get_kind(name), "ignored": {}}
+                        changed_files += 1
+                    ignored = not matcher.is_included(os.path.join(path, name), is_dir=False)
+                    if record["ignored"].get(key) != ignored:
+                        record["ignored"][key] = ignored
+                        changed_files += 1
+                    files[relative_path] = record
+
+                subdirectories = []
+                for name in entry["dirs"]:
+                    relative_path = os.path.join(relative_dir, name)
+                    if matcher.is_included(os.path.join(path, name), is_dir=True):
+                        subdirectories.append(submit(relative_path, rules))
+                    else:
+                        pruned.add(relative_path)
+                pending.extend(reversed(subdirectories))
+
+            unhashed = [path for path, record in files.items()
+                        if record["sha1"] is None and record["kind"] != "other" and not record["ignored"][key]]
+            for path, sha1 in zip(unhashed, executor.map(self.hash_file, unhashed)):
+                files[path]["sha1"] = sha1
+
+        def is_below_pruned(relative_path):
+            parent = os.path.dirname(relative_path)
+            while parent:
+                if parent in pruned:
+                    return True
+                parent = os.path.dirname(parent)
+            return False
+
+        for relative_dir, entry in self.directories.items():
+            if relative_dir not in directories and (relative_dir in pruned or is_below_pruned(relative_dir)):
+                directories[relative_dir] = entry
+        for relative_path, record in self.files.items():
+            if relative_path not in files and is_below_pruned(relative_path):
+                if record["ignored"].get(key) is not True:
+                    record["ignored"][key] = True
+                    changed_files += 1
+                files[relative_path] = record
+
+        if changed_files or len(files) != len(self.files) or directories != self.directories:
+            self.changed = True
+        self.directories = directories
+        self.files = files
+
+    def hash_file(self, relative_path):
+        try:
+            return get_file_hash(os.path.join(self.root, relative_path))
+        except OSError:
+            return None
+
+    def get_files(self, ignore_files):
+        """
+        Return the absolute paths of the files that are not ignored by the 'ignore_files' (like walk() does),
+        as determined by the last refresh() with these ignore files.
+        """
+        key = ",".join(ignore_files)
+        return [os.path.join(self.root, path) for path, record in self.files.items() if record["ignored"].get(key) is False]
+
+    def save(self):
+        if not self.changed:
+            return
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w", encoding="utf-8") as f:
+            json.dump({"version": INVENTORY_VERSION, "root": self.root, "directories": self.directories,
+                       "files": self.files}, f)
+        os.replace(temp_filename, self.filename)
+        self.changed = False
+
+
+def get_index_filename():
+    return os.environ.get(INVENTORY_VARIABLE, "")
+
+
+# the files below path that are not ignored, from the (refreshed) index in 'index_filename'
+def get_files_from_index(index_filename, path, ignore_files):
+    inventory = Inventory(os.path.abspath(index_filename), path)
+    inventory.refresh(ignore_files)
+    result = inventory.get_files(ignore_files)
+    inventory.save()
+    return result
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Builds or lists the persistent inventory of the files in a source tree")
+    parser.add_argument('--index', metavar="FILE", default=get_index_filename(),
+                        help=f"the index file, defaults to ${INVENTORY_VARIABLE}")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser('build', help="create or refresh the index")
+    build.add_argument('path', help="root of the source tree")
+    listing = commands.add_parser('list', help="print the files that are not ignored, without an index the tree is walked")
+    listing.add_argument('path', help="root of the source tree")
+    for command in [build, listing]:
+        command.add_argument('--ignore-file', metavar="NAME", action="append", default=None,
+                             help="name of the ignore files to obey, can be repeated, defaults to .opencanaryignore")
+    listing.add_argument('--extension', metavar="EXT", nargs="+", default=[], help="only list files with these extensions")
+    listing.add_argument('--kind', nargs="+", default=[], choices=["header", "source", "project", "cmake", "other"],
+                         help="only list files of these kinds")
+    listing.add_argument('-0', '--null', action="store_true", help="separate the files with a null character, for xargs -0")
+    args = parser.parse_args()
+    if args.command == "build" and not args.index:
+        parser.error(f"build needs --index or ${INVENTORY_VARIABLE}")
+    return args
+
+
+def main():
+    args = parse_arguments()
+    ignore_files = args.ignore_file if args.ignore_file is not None else ['.opencanaryignore']
+    if args.command == "build":
+        inventory = Inventory(os.path.abspath(args.index), args.path)
+        inventory.refresh(ignore_files)
+        inventory.save()
+        eprint(len(inventory.files), "file(s) in", len(inventory.directories), "directories indexed in", args.index)
+        return
+
+    files = util.get_files_from_directory(args.path, ignore_files, index_filename=args.index)
+    if args.extension:
+        files = [filename for filename in files if filename.endswith(tuple(args.extension))]
+    if args.kind:
+        files = [filename for filename in files if get_kind(filename) in args.kind]
+    separator = "\0" if args.null else "\n"
+    for filename in files:
+        sys.stdout.write(os.path.relpath(filename) + separator)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BrokenPipeError:   # still makes piping into 'head -n' work nicely
+        sys.stderr.close()
+        sys.exit(0)
+    except:
+        info = traceback.format_exc()
+        eprint(info)
+        sys.exit(1)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Filter expressions that test the columns of an issue, compiled into one matcher per column
+
+  rule in {C4244, C4267}
+  component == "3rdparty" and rule == C4706
+  file contains {external/, _autogen} or description matches "(?i)deprecated"
+
+- columns: prio, team, component, file, source, rule, category, description and link (see util.Column)
+- column == value, column != value, column in {values}: the column is equal to (one of) the value(s)
+- column contains value, column contains {values}: the column contains (one of) the value(s)
+- column matches regex: re.search() of the regex finds a match in the column
+- and, or, not and parentheses combine the tests, values are "quoted" or bare words without spaces, quotes, = or !
+
+All tests on one column are evaluated together, a set lookup for the exact values and one combined regex that
+checks whether any of the contained values occurs. The result per value is remembered for the columns with few
+distinct values (see util.interned_fields) and the result per combination of tests is remembered as well,
+so filtering an issue costs a few dict lookups.
+"""
+
+import re
+import util
+
+token_pattern = re.compile(r'''\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<operator>==|!=|[{},()])|(?P<word>[^\s{},()"=!]+))''')
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = token_pattern.match(expression, position)
+        if not match:
+            raise ValueError(f"invalid filter expression at position {position}: {expression}")
+        position = match.end()
+        if match.group("string") is not None:
+            tokens.append(("value", re.sub(r'\\(.)', r'\1', match.group("string")[1:-1])))
+        elif match.group("operator") is not None:
+            tokens.append(("operator", match.group("operator")))
+        else:
+            tokens.append(("word", match.group("word")))
+    return tokens
+
+
+class Parser:
+    """
+    Parses one expression into a tree of ('or', a, b), ('and', a, b), ('not', a) and ('test', column, kind, values)
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def error(self, message):
+        raise ValueError(f"{message} in filter expression: {self.expression}")
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def is_next(self, kind, text):
+        return self.peek() == (kind, text)
+
+    def parse(self):
+        tree = self.parse_or()
+        if self.position != len(self.tokens):
+            self.error(f"unexpected '{self.peek()[1]}'")
+        return tree
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.is_next("word", "or"):
+            self.take()
+            tree = ("or", tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_not()
+        while self.is_next("word", "and"):
+            self.take()
+            tree = ("and", tree, self.parse_not())
+        return tree
+
+    def parse_not(self):
+        if self.is_next("word", "not"):
+            self.take()
+            return ("not", self.parse_not())
+        if self.is_next("operator", "("):
+            self.take()
+            tree = self.parse_or()
+            if self.take() != ("operator", ")"):
+                self.error("missing ')'")
+            return tree
+        return self.parse_test()
+
+    def parse_test(self):
+        kind, column = self.take()
+        if kind != "word" or column not in util.issue_fields:
+            self.error(f"expected a column name ({', '.join(util.issue_fields)}) instead of '{column}'")
+        column = util.issue_fields.index(column)
+        kind, operator = self.take()
+        if operator == "==" or operator == "in":
+            return ("test", column, "equals", self.parse_values(operator == "in"))
+        if operator == "!=":
+            return ("not", ("test", column, "equals", self.parse_values(False)))
+        if operator == "contains":
+            return ("test", column, "contains", self.parse_values(True))
+        if operator == "matches":
+            values = self.parse_values(False)
+            try:
+                re.compile(values[0])
+            except re.error as e:
+                self.error(f"invalid regex '{values[0]}' ({e})")
+            return ("test", column, "matches", values)
+        self.error(f"expected ==, !=, in, contains or matches instead of '{operator}'")
+
+    def parse_values(self, allow_set):
+        if allow_set and self.is_next("operator", "{"):
+            self.take()
+            values = [self.parse_value()]
+            while self.is_next("operator", ","):
+                self.take()
+                values.append(self.parse_value())
+            if self.take() != ("operator", "}"):
+                self.error("missing '}'")
+            return tuple(values)
+        return (self.parse_value(),)
+
+    def parse_value(self):
+        kind, text = self.take()
+        if kind not in ["value", "word"]:
+            self.error(f"expected a value instead of '{text}'")
+        return text
+
+
+class ColumnMatcher:
+    """
+    All tests of the expressions on one column, get_mask() returns the bits of the tests that are true for a value
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.equals = {}        # value: bits
+        self.contains = []      # (text, bit)
+        self.matches = []       # (compiled regex, bit)
+        self.any_contained = None
+        self.memo = {} if util.issue_fields[column] in util.interned_fields else None
+
+    def add(self, kind, values, bit):
+        if kind == "equals":
+            for value in values:
+                self.equals[value] = self.equals.get(value, 0) | bit
+        elif kind == "contains":
+            self.contains += [(value, bit) for value in values]
+            self.any_contained = re.compile("|".join(re.escape(text) for text, _bit in self.contains))
+        else:
+            self.matches.append((re.compile(values[0]), bit))
+
+    def get_mask(self, value):
+        if self.memo is not None:
+            mask = self.memo.get(value)
+            if mask is None:
+                mask = self.memo[value] = self.find_mask(value)
+            return mask
+        return self.find_mask(value)
+
+    def find_mask(self, value):
+        mask = self.equals.get(value, 0)
+        if self.any_contained is not None and self.any_contained.search(value):
+            for text, bit in self.contains:
+                if text in value:
+                    mask |= bit
+        for regex, bit in self.matches:
+            if regex.search(value):
+                mask |= bit
+        return mask
+
+
+class IssueFilter:
+    """
+    A list of filter expressions, matches() is true for an issue (the fields in Column order) when one of them is true,
+    a line that is not an issue (with another number of fields) never matches
+    """
+
+    def __init__(self, expressions):
+        self.tests = {}         # (column, kind, values): bit
+        self.columns = {}       # column: ColumnMatcher
+        self.trees = [self.compile(Parser(expression).parse()) for expression in expressions]
+        self.column_matchers = list(self.columns.values())
+        self.decisions = {}
+
+    def compile(self, tree):
+        if tree[0] == "test":
+            _test, column, kind, values = tree
+            key = (column, kind, values)
+            if key not in self.tests:
+                bit = 1 << len(self.tests)
+                self.tests[key] = bit
+                self.columns.setdefault(column, ColumnMatcher(column)).add(kind, values, bit)
+            return ("test", self.tests[key])
+        return (tree[0],) + tuple(self.compile(child) for child in tree[1:])
+
+    def evaluate(self, tree, mask):
+        if tree[0] == "test":
+            return (mask & tree[1]) != 0
+        if tree[0] == "not":
+            return not self.evaluate(tree[1], mask)
+        if tree[0] == "and":
+            return self.evaluate(tree[1], mask) and self.evaluate(tree[2], mask)
+        return self.evaluate(tree[1], mask) or self.evaluate(tree[2], mask)
+
+    def matches(self, parts):
+        if len(parts) != len(util.issue_fields):
+            return False
+        mask = 0
+        for matcher in self.column_matchers:
+            mask |= matcher.get_mask(parts[matcher.column])
+        decision = self.decisions.get(mask)
+        if decision is None:
+            decision = self.decisions[mask] = any(self.evaluate(tree, mask) for tree in self.trees)
+        return decision
@@ -6,10 +6,7 @@ import traceback, sys, os
 from util import *
 
 def read():
-    results = []
-    for line in sys.stdin:
-        results += [read_structured_line(line)]
-    return results
+    return list(read_issues())
 
 def countRules(lines):
     results = {}
@@ -10,11 +10,21 @@
 
 import traceback
 import sys
+import codecs
+import collections
+import contextlib
+import functools
+import heapq
+import mmap
+import time
 import os
 import re
+import argparse
+import hashlib
+import json
+import multiprocessing
 import xml.etree.ElementTree as ET
 import gitignore_parser
-import subprocess
 
 import util
 from util import Priority, eprint
@@ -23,6 +33,22 @@ ns = '{http://schemas.microsoft.com/developer/msbuild/2003}'
 
 ignore_rule_list = []
 
+# issue lines reported by the checks, collected per file so a file can be checked in a worker process
+collected_issues = []
+
+# with --cache: the sha1 of the content of the file that is being checked, calculated by open_source()
+source_hash = None
+hash_sources = False
+
+# with --profile: [seconds, evaluations, hits] per rule for the file that is being checked
+rule_profile = None
+
+# with --profile: the ScanProfile that collects the rule_profile and time of every checked file
+scan_profile = None
+
+# longer lines are reported as 'skipped' instead of checked, this bounds the time spent per line
+max_line_length = 2000
+
 wrong_word_list = [
     'accomodate', 'aquire', 'arguement', 'athiest', 'belive', 'bizzare', 'calender', 'carribean',
     'cemetary', 'cheif', 'collegue', 'collectable', 'columist', 'commitee', 'comitted', 'concensus',
@@ -40,21 +66,14 @@ wrong_word_list = [
 ]
 
 
-def rip_grep(word):
-    result = []
-    command = f"rg -o -n -w --color=never --no-heading --with-filename --column {word}"
-    rg_result = subprocess.run(command, check=False, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    for line in rg_result.stdout.splitlines():
-        if line.strip() != "":
-            result += [[line, word]]
-    return result
+wrong_words = frozenset(wrong_word_list)
+wrong_words_bytes = frozenset(word.encode("ascii") for word in wrong_word_list)
 
+# a word is a maximal run of word characters, the same definition 'rg -w' uses
+word_pattern = re.compile(r"\w+")
 
-def get_spelling_violations():
-    result = []
-    for word in wrong_word_list:
-        result += rip_grep(word)
-    return result
+# in bytes \w only matches ascii, so any word that word_pattern finds in the decoded text is also found here
+word_pattern_bytes = re.compile(rb"\w+")
 
 
 def get_project_xml_root(projectname):
@@ -79,15 +98,177 @@ def get_cpp_files_from_project(project_root, project_directory):
     return result
 
 
-def check_cpp_source(filename):
-    line_number = 0
-    for line in read_lines(filename):
-        line_number = line_number + 1
-        check_line(filename, line_number, line)
-
-
-def read_lines(filename):
-    return open(filename, encoding='utf-8').readlines()  # , errors='ignore'
+# reads and checks a header or source file in one pass, the rules that do not apply to the kind of file are skipped
+def check_cpp_source(filename, is_header):
+    if is_header:
+        rules, code_trigger = header_rules, header_code_trigger
+    else:
+        rules, code_trigger = source_rules, source_code_trigger
+    with open_source(filename) as data:
+        lines, comments = read_source_lines(data, code_trigger)
+        for line_number, code, comment in lines:
+            check_line(filename, line_number, code, comment, rules)
+        check_spelling_AP19(filename, comments)
+
+
+def read_lines(filename, encoding='utf-8', errors='strict'):
+    with open(filename, encoding=encoding, errors=errors) as f:
+        return f.readlines()
+
+
+# matches a carriage return that is not part of a \r\n line ending
+lone_carriage_return = re.compile(rb"\r(?!\n)")
+
+
+@contextlib.contextmanager
+def open_source(filename):
+    """
+    Yields the content of a file as bytes, memory-mapped if possible.
+    When hash_sources is set, the sha1 of the content as it is on disk is stored in source_hash.
+    Files that need more than splitting on \\n to get the same lines as text-mode reading
+    (utf-16 or lone \\r line endings) are decoded as a whole and re-encoded to utf-8.
+    """
+    global source_hash
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            if hash_sources:
+                source_hash = hashlib.sha1(b"").hexdigest()
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if hash_sources:
+                source_hash = hashlib.sha1(data).hexdigest()
+            if data[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+                yield "".join(read_lines(filename, encoding='utf-16')).encode("utf-8")
+            elif data.find(b"\r") != -1 and lone_carriage_return.search(data):
+                yield "".join(read_lines(filename, errors='surrogateescape')).encode("utf-8", errors='surrogateescape')
+            else:
+                yield data
+
+
+# legacy (non utf-8) encoded lines are decoded as windows-1252 instead of failing the whole file
+def decode_line(raw):
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+
+def read_matching_lines(data, trigger):
+    """
+    Yields (line_number, line) for the lines of data that the bytes pattern 'trigger' matches.
+    Only those lines are decoded. A line is returned as text-mode reading returns it, ending
+    with '\\n' (also for \\r\\n line endings), except for the last line if the data does not end with a newline.
+    """
+    size = len(data)
+    line_number = 1
+    line_start = 0
+    position = 0
+    while position <= size:
+        match = trigger.search(data, position)
+        if match is None:
+            return
+        start = data.rfind(b"\n", line_start, match.start()) + 1
+        if start == 0:
+            start = line_start
+        line_number += data[line_start:start].count(b"\n")
+        line_start = start
+
+        end = data.find(b"\n", match.start())
+        if end == -1:
+            end = size
+        raw = data[start:end]
+        if end < size:
+            if raw.endswith(b"\r"):
+                raw = raw[:-1]
+            yield line_number, decode_line(raw) + "\n"
+        else:
+            yield line_number, decode_line(raw)
+        position = end + 1
+
+
+# one token per comment, #include directive (so its header name stays code), string or character literal.
+# Every alternative starts with a literal character, that lets the regex engine skip to the next candidate quickly,
+# so the R of a raw string checks its (optional) prefix behind it. Unterminated comments and raw strings end at the
+# end of the data, so a failed match never scans the rest again.
+source_tokens = re.compile(rb"""
+      //[^\n]*
+    | /\*.*?(?:\*/|\Z)
+    | \#[ \t]*include[ \t]*(?:"[^"\n]*"|<[^>\n]*>)
+    | R(?:(?<![A-Za-z0-9_]R)|(?<=(?<![A-Za-z0-9_])[uUL]R)|(?<=(?<![A-Za-z0-9_])u8R))"([^()\\\s"]{0,16})\(.*?(?:\)\1"|\Z)
+    | "(?:\\.|[^"\\\n])*"
+    | '(?<![0-9A-Fa-f]')(?:\\.|[^'\\\n])*'
+    """, re.DOTALL | re.VERBOSE)
+
+# replaces every byte by a space, except line endings, so blanked text keeps its line numbers and columns
+blank_table = bytes(byte if byte in b"\r\n" else ord(" ") for byte in range(256))
+
+# the blanks directly before a line ending
+line_end_blanks = re.compile(rb" +(?=\r?\n)")
+
+
+# blanks text for the code stream, the blanks that would end a line are left out, so they do not end up in the
+# descriptions, trailing whitespace that is part of the code is kept
+def blank_code(text, ends_line):
+    blanked = line_end_blanks.sub(b"", text.translate(blank_table))
+    if ends_line:
+        return blanked.rstrip(b" ")
+    return blanked
+
+
+def lex_source(data):
+    """
+    Splits c++ source (bytes) in a single pass into two buffers with the same lines as data:
+    the code, with comments blanked and the contents of string and character literals blanked (the quotes remain),
+    see blank_code(), and the comments, with everything else blanked (of the same length as data).
+    """
+    code = []
+    comments = []
+    position = 0
+    for token in source_tokens.finditer(data):
+        start, end = token.span()
+        gap = data[position:start]
+        code.append(gap)
+        comments.append(gap.translate(blank_table))
+        text = token.group()
+        kind = text[:1]
+        raw_delimiter = token.group(1)
+        if kind == b"/":
+            code.append(blank_code(text, data[end:end + 1] in (b"", b"\r", b"\n")))
+            comments.append(text)
+        elif kind == b"#":
+            code.append(text)
+            comments.append(text.translate(blank_table))
+        else:
+            if raw_delimiter is not None:
+                content_start = text.index(b"(") + 1
+                content_end = len(text)
+                if text.endswith(b")" + raw_delimiter + b'"') and len(text) - len(raw_delimiter) - 2 >= content_start:
+                    content_end = len(text) - len(raw_delimiter) - 2
+            else:
+                content_start = 1
+                content_end = len(text) - 1
+            code.append(text[:content_start] + blank_code(text[content_start:content_end], False) + text[content_end:])
+            comments.append(text.translate(blank_table))
+        position = end
+    rest = data[position:]
+    code.append(rest)
+    comments.append(rest.translate(blank_table))
+    return b"".join(code), b"".join(comments)
+
+
+def read_source_lines(data, code_trigger):
+    """
+    Lexes data and returns the (line_number, code, comment) tuples of the lines where code_trigger matches the
+    code or comment_trigger matches the comments, together with the comments of the whole file.
+    The part of a line that is missing from a stream is an empty string.
+    """
+    code, comments = lex_source(data)
+    code_lines = dict(read_matching_lines(code, code_trigger))
+    comment_lines = dict(read_matching_lines(comments, comment_source_trigger))
+    lines = [(line_number, code_lines.get(line_number, ""), comment_lines.get(line_number, ""))
+             for line_number in sorted(code_lines.keys() | comment_lines.keys())]
+    return lines, comments
 
 
 def get_priority():
@@ -116,8 +297,25 @@ def report_issue_detail(fileref, filename, line, rule, description, component, c
     links = create_default_link(filename, line)
     team = ""
     component = ""
-    util.report(get_priority(), team, component, fileref,
-                get_source(), rule, category, description, links)
+    issue = util.create_issue(get_priority(), team, component, fileref,
+                              get_source(), rule, category, description, links)
+    collected_issues.append(util.join_report_line(issue))
+
+
+def take_collected_issues():
+    global collected_issues
+    result = collected_issues
+    collected_issues = []
+    return result
+
+
+def print_issues(lines):
+    if util.output_format == "bin":
+        for line in lines:
+            util.write_binary_fields(line.split("|"))
+        return
+    for line in lines:
+        util.write_text_line(line)
 
 
 def report_issue(filename, line, rule, category, description):
@@ -142,161 +340,532 @@ def clean_group(match_group):
     return match_group.group(1).replace("\n", "")
 
 
-def check_line(filename, line_number, line):
+def set_max_line_length(value):
+    global max_line_length
+    max_line_length = value
+
+
+# 'code' and 'comment' are the two streams of the same line, see lex_source()
+def check_line(filename, line_number, code, comment, rules):
+    length = max(len(code), len(comment))
+    if length > max_line_length:
+        report_issue(filename, str(line_number), "SKIPPED", "skipped",
+                     f"Line of {length} characters not checked, the maximum is {max_line_length}")
+        return
     try:
-        check_line_impl(filename, str(line_number), line)
+        check_line_impl(filename, str(line_number), code, comment, rules)
     except:
-        eprint("open canary parsing error: ", filename + ":" + line_number)
-        eprint(line)
+        eprint("open canary parsing error: ", filename + ":" + str(line_number))
+        eprint(code)
+        eprint(comment)
         raise
 
 
+# a rule reports an issue when all 'required' literals and none of the 'excluded' literals occur in the line
+# and, if it has one, the precompiled 'search' also matches. 'description' is either a string or a function
+# that creates the description from the match object. 'stream' is the part of the line the rule looks at,
+# CODE or COMMENT, see lex_source(), 'files' is the kind of file the rule applies to, ANY, HEADER or SOURCE.
+ScanRule = collections.namedtuple('ScanRule', ['rule', 'category', 'description', 'search', 'required', 'excluded', 'stream', 'files'])
+CODE = "code"
+COMMENT = "comment"
+ANY = "any"
+HEADER = "header"
+SOURCE = "source"
+ScanRule.__new__.__defaults__ = (CODE, ANY)
+
+
+def get_stream(rule, code, comment):
+    if rule.stream == COMMENT:
+        return comment
+    return code
+
+
+def find_rule(rule, line):
+    for literal in rule.required:
+        if literal not in line:
+            return None
+    for literal in rule.excluded:
+        if literal in line:
+            return None
+    if rule.search is None:
+        return True
+    return rule.search(line)
+
+
+def get_rule_description(rule, match):
+    if callable(rule.description):
+        return rule.description(match)
+    return rule.description
+
+
+# the functions below are linear-time equivalents of patterns that backtrack badly on long lines,
+# like the patterns they replace they assume a single line, so only a trailing newline
+
+condition_start = re.compile(r"(while|if|switch)\s*\(")
+spaced_assignment = re.compile(r"\s=\s")
+
+
+# same result as re.search(r"(while|if|switch)\s*\(.*\s=\s.*\)", line), the earliest condition and
+# assignment leave the most room for the others, so only those need to be checked
+def find_assignment_in_condition(line):
+    condition = condition_start.search(line)
+    if not condition:
+        return None
+    assignment = spaced_assignment.search(line, condition.end())
+    if not assignment:
+        return None
+    if line.find(")", assignment.end()) == -1:
+        return None
+    return condition
+
+
+define_start = re.compile(r"#define", re.IGNORECASE)
+min_or_max_start = re.compile(r"(?=min|max)", re.IGNORECASE)
+min_or_max_until_end = re.compile(r"((min|max).*)", re.IGNORECASE)
+
+
+# same result as re.search(r"#define.*((min|max).*\(.*?.*:.*$)", line, re.IGNORECASE), the greedy .* selects
+# the last min/max that is followed by a '(' that is followed by a ':', the group then runs until the end of the line
+def find_min_max_define(line):
+    define = define_start.search(line)
+    if not define:
+        return None
+    end = len(line) - 1 if line.endswith("\n") else len(line)
+    last_colon = line.rfind(":", 0, end)
+    last_parenthesis = line.rfind("(", 0, last_colon) if last_colon != -1 else -1
+    start = None
+    for candidate in min_or_max_start.finditer(line, define.end()):
+        if candidate.start() + 3 > last_parenthesis:
+            break
+        start = candidate.start()
+    if start is None:
+        return None
+    return min_or_max_until_end.match(line, start)
+
+
+non_english_words = re.compile(r"(\sdeze\s|\sniet\s|\w+ectie|\snaam\s|\sals\s|voet)", re.IGNORECASE)
+non_english_words_without_ectie = re.compile(r"(\sdeze\s|\sniet\s|\snaam\s|\sals\s|voet)", re.IGNORECASE)
+ectie = re.compile(r"ectie", re.IGNORECASE)
+
+
+# \w+ectie backtracks quadratically over long words, so it is only used when the line contains 'ectie'
+def find_non_english_word(line):
+    if ectie.search(line):
+        return non_english_words.search(line)
+    return non_english_words_without_ectie.search(line)
+
+
 # Rule numbering is continuous over the prefix, in the sense that #1 occurs only once so MO#1, MO#2, AP#3
-def check_line_impl(filename, line_number, line):
-    if "/make_unique" in line:
-        report_issue(filename, line_number, "MO#1", "modernize", "For C++14 and later use #include <memory>")
-    else:
-        if "make_unique" in line and not "std::make_unique" in line:
-            report_issue(filename, line_number, "MO#2", "modernize", "For C++14 and later use std::make_unique")
-
-    if "reinterpret_cast<" in line:
-        report_issue(filename, line_number, "AP#3", "casting", "Anti-pattern: do not reinterpret_cast")
-
-    if re.search(r"[^a-z]volatile[^a-z].*;", line):
-        report_issue(filename, line_number, "AP#4", "redflag", "Anti-pattern: do not use volatile")
-    if re.search(r"\sNULL\s", line):
-        report_issue(filename, line_number, "MO#5", "modernize", "Anti-pattern: do not use NULL, use 0 or nullptr instead")
-
-    match_group = re.search(r"(\sdeze\s|\sniet\s|\w+ectie|\snaam\s|\sals\s|voet)", line, re.IGNORECASE)
-    if match_group:
-        report_issue(filename, line_number, "AP#6", "readability", f"Anti-pattern: do not use non-english words ('{clean_group(match_group)}') in code or comments")
-    match_group = re.search(r"(#if\s+\d)", line)
-    if match_group:
-        report_issue(filename, line_number, "AP#7", "readability", f"Anti-pattern: {clean_group(match_group)}, do not keep historical code in ifdefs")
-    if re.search(r"\(\w+\s*\*\s*\)", line):
-        report_issue(filename, line_number, "AP#8", "modernize", "Anti-pattern: dont use c-style casts")
-    match_group = re.search(r"#define\s+(_\w+)", line)
-    if match_group:
-        report_issue(filename, line_number, "AP#9", "ub", "prevent UB: names starting with underscore, followed by a capital ({clean_group(match_group)}) are reserved ")
-    match_group = re.search(r"#define.*((min|max).*\(.*?.*:.*$)", line, re.IGNORECASE)
-    if match_group:
-        report_issue(filename, line_number, "AP#10", "modernize", f"Anti-pattern: do not define {clean_group(match_group)}, use std::min and std::max")
-    if re.search(r"($|[^\w])extern\s+[^\"]", line):
-        report_issue(filename, line_number, "AP#11", "redflag", "Anti-pattern: do not use extern")
-
-    #    if re.search("($|[^\w])register\s", line):
-    #        report_issue(filename, str(lineNumber), "AP#12", "redflag", "Anti-pattern: do not use register") # disabled because of too many false positives, and also compilers already catch it
-
-    if re.search(r"($|[^\w])delete\s\w{1,25};", line):
-        report_issue(filename, line_number, "AP#13", "redflag", "Anti-pattern: do not use delete")
-    if "extern volatile" in line:
-        report_issue(filename, line_number, "AP#14", r"redflag", "Anti-pattern: extern volatile ?!")
-    if re.search(r"\(char\s*\*\)\s*\"", line):
-        report_issue(filename, line_number, "AP#15", "ub", "prevent UB: do not cast away constness of string literals")
-    if re.search(r"const_cast<", line):
-        report_issue(filename, line_number, "AP#16", "readability", "Anti-pattern: do not cast away constness")
-
-    #  AP#17 see checkCppHeader_AP17()
-
-    if re.search(r"(while|if|switch)\s*\(.*\s=\s.*\)", line):
-        report_issue(filename, line_number, "AP#18", "assign_in_condition", "Anti-pattern: do not assign inside conditions")
-
-    # if "catch\s+\(...\)" in line:
-    # if "catch\s+(...).*\n*.*\{[\n.]*throw[\n.]*\}" in line:
-    #    report_issue(filename, str(lineNumber), "AP#", "redflag", "Anti-pattern: catch(...) should always rethrow")    # too many false positives
-
-    # would be nice for new code, but is too generic (and should be allowed in Qt code)
-    # if "new" in line and not "#define new" in line:
-    #    report_issue(filename, str(lineNumber), "MO#", "Prefer std::make_unique over bare new/delete")
+# the order of the rules is the order in which the issues of one line are reported
+scan_rules = [
+    ScanRule("MO#1", "modernize", "For C++14 and later use #include <memory>", None, ("/make_unique",), ()),
+    ScanRule("MO#2", "modernize", "For C++14 and later use std::make_unique", None, ("make_unique",), ("/make_unique", "std::make_unique")),
+    ScanRule("AP#3", "casting", "Anti-pattern: do not reinterpret_cast", None, ("reinterpret_cast<",), ()),
+    ScanRule("AP#4", "redflag", "Anti-pattern: do not use volatile",
+             re.compile(r"[^a-z]volatile[^a-z].*;").search, ("volatile", ";"), ()),
+    ScanRule("MO#5", "modernize", "Anti-pattern: do not use NULL, use 0 or nullptr instead",
+             re.compile(r"\sNULL\s").search, ("NULL",), ()),
+    ScanRule("AP#6", "readability",
+             lambda match: f"Anti-pattern: do not use non-english words ('{clean_group(match)}') in comments",
+             find_non_english_word, (), (), COMMENT),
+    ScanRule("AP#7", "readability",
+             lambda match: f"Anti-pattern: {clean_group(match)}, do not keep historical code in ifdefs",
+             re.compile(r"(#if\s+\d)").search, ("#if",), ()),
+    ScanRule("AP#8", "modernize", "Anti-pattern: dont use c-style casts",
+             re.compile(r"\((?=(\w+))\1\s*\*\s*\)").search, ("(", "*", ")"), ()),  # (?=(\w+))\1 does not backtrack into the word
+    ScanRule("AP#9", "ub", "prevent UB: names starting with underscore, followed by a capital ({clean_group(match_group)}) are reserved ",
+             re.compile(r"#define\s+(_\w+)").search, ("#define",), ()),
+    ScanRule("AP#10", "modernize",
+             lambda match: f"Anti-pattern: do not define {clean_group(match)}, use std::min and std::max",
+             find_min_max_define, ("#", "(", ":"), ()),
+    ScanRule("AP#11", "redflag", "Anti-pattern: do not use extern",
+             re.compile(r"($|[^\w])extern\s+[^\"]").search, ("extern",), ()),
+    # AP#12 'register' is disabled because of too many false positives, and also compilers already catch it
+    ScanRule("AP#13", "redflag", "Anti-pattern: do not use delete",
+             re.compile(r"($|[^\w])delete\s\w{1,25};").search, ("delete", ";"), ()),
+    ScanRule("AP#14", "redflag", "Anti-pattern: extern volatile ?!", None, ("extern volatile",), ()),
+    ScanRule("AP#15", "ub", "prevent UB: do not cast away constness of string literals",
+             re.compile(r"\(char\s*\*\)\s*\"").search, ("(char",), ()),
+    ScanRule("AP#16", "readability", "Anti-pattern: do not cast away constness", None, ("const_cast<",), ()),
+    ScanRule("AP#18", "assign_in_condition", "Anti-pattern: do not assign inside conditions",
+             find_assignment_in_condition, ("(", "=", ")"), ()),
+    # AP#17 is reported after the other rules of the line
+    ScanRule("AP#17", "redflag", "Using namespace found in header file",
+             re.compile("using namespace").match, ("using namespace",), (), CODE, HEADER),
+
+    # catch(...) should always rethrow: too many false positives
+    # 'prefer std::make_unique over bare new/delete' would be nice for new code, but is too generic (and should be allowed in Qt code)
 
     # Current highest number at:  #19
+]
 
+header_rules = [rule for rule in scan_rules if rule.files != SOURCE]
+source_rules = [rule for rule in scan_rules if rule.files != HEADER]
 
-def check_cpp_header_AP17(filename):
-    line_number = 0
-    for line in read_lines(filename):
-        line_number = line_number + 1
-        check_line(filename, line_number, line)
-        if re.search("^using namespace", line):
-            report_issue(filename, str(line_number), "AP#17", "redflag", "Using namespace found in header file")
+# every rule above requires at least one of these literals in its stream (AP#6 case-insensitive, like its own pattern),
+# so the common line, that contains none of them, costs a single scan per stream
+code_trigger = re.compile(r"[(#]|_cast|extern|volatile|NULL|make_unique|delete|^using namespace")
+comment_trigger = re.compile(r"(?i:deze|niet|ectie|naam|als|voet)")
 
+# the same triggers for the undecoded streams, comment lines with non-ascii bytes are always decoded
+# so the case-insensitive part keeps its unicode meaning. Only headers are checked for AP#17.
+source_code_trigger = re.compile(rb"[(#]|_cast|extern|volatile|NULL|make_unique|delete")
+header_code_trigger = re.compile(source_code_trigger.pattern + rb"|(?<![^\n])using namespace")
+comment_source_trigger = re.compile(comment_trigger.pattern.encode("ascii") + rb"|[\x80-\xff]")
 
-def get_file_reference(file):
-    pattern = r'^.*(:\d*)?(:\d*)?'
-    match = re.search(pattern, file)
-    if match:
-        return match.group(0)
-    return file
+
+def check_line_impl(filename, line_number, code, comment, rules):
+    if rule_profile is not None:
+        check_line_profiled(filename, line_number, code, comment, rules)
+        return
+    if not code_trigger.search(code) and not comment_trigger.search(comment):
+        return
+    for rule in rules:
+        match = find_rule(rule, get_stream(rule, code, comment))
+        if match:
+            report_issue(filename, line_number, rule.rule, rule.category, get_rule_description(rule, match))
 
 
-def get_filename_and_line(file):
-    pattern = r'(^.*):(\d+)'
-    match = re.search(pattern, file)
-    if match.groups().count == 2:
-        return match.group(0), match.group(1)
-    return file, 0
+def add_rule_profile(rule, seconds, hit):
+    entry = rule_profile.setdefault(rule, [0.0, 0, 0])
+    entry[0] += seconds
+    entry[1] += 1
+    entry[2] += 1 if hit else 0
 
 
-def check_spelling_AP19():
-    for file, word in get_spelling_violations():
-        category = "spelling"
-        description = f"Missspelled word '{word}' found'"
-        # util.report(get_priority(), team, component, fileref, source, "AP#19", category, description, links)
-        # report_issue(filename, str(line_number), "AP#19", "spelling", f"Missspelled word '{word}' found'")
-        fileref = get_file_reference(file)
-        filename, line_number = get_filename_and_line(fileref)
-        print(f"fileref: {fileref}, filename: '{filename}', line_number: {line_number}")
+# same as check_line_impl, but records the time spent per rule
+def check_line_profiled(filename, line_number, code, comment, rules):
+    start = time.perf_counter()
+    triggered = code_trigger.search(code) or comment_trigger.search(comment)
+    add_rule_profile("(line trigger)", time.perf_counter() - start, triggered)
+    if not triggered:
+        return
+    for rule in rules:
+        start = time.perf_counter()
+        match = find_rule(rule, get_stream(rule, code, comment))
+        add_rule_profile(rule.rule, time.perf_counter() - start, match)
+        if match:
+            report_issue(filename, line_number, rule.rule, rule.category, get_rule_description(rule, match))
+
+
+def check_spelling_AP19(filename, data):
+    start = time.perf_counter()
+    # most files contain none of the words, so only look for the lines when the file does
+    found_words = wrong_words_bytes.intersection(word_pattern_bytes.findall(data))
+    if rule_profile is not None:
+        add_rule_profile("AP#19", time.perf_counter() - start, found_words)
+    if not found_words:
+        return
+    trigger = re.compile(b"|".join(re.escape(word) for word in sorted(found_words)))
+    for line_number, line in read_matching_lines(data, trigger):
+        for match in word_pattern.finditer(line):
+            if match.group() in wrong_words:
+                report_issue(filename, str(line_number), "AP#19", "spelling", f"Misspelled word '{match.group()}' found")
 
-        # report_issue_detail(fileref, filename, line_number, "AP#19", description, "", category)
 
+def is_warning_as_error(cl_compile_node):
+    if cl_compile_node is None:
+        return False
+    warning_as_error_node = cl_compile_node.find(ns + 'TreatWarningAsError')
+    return warning_as_error_node is not None and warning_as_error_node.text.lower() == "true"
 
+
+def is_warning_level_4(cl_compile_node):
+    if cl_compile_node is None:
+        return False
+    warning_level = cl_compile_node.find(ns + 'WarningLevel')
+    return warning_level is not None and warning_level.text.endswith("4")
+
+
+# checks all project rules in one streaming pass, the issues are reported per rule, UD#4 for every
+# ItemDefinitionGroup that does not set TreatWarningAsError to true, then UD#5 for every group without warning level 4
 def check_project(projectname):
-    project_root = get_project_xml_root(projectname)
 
     # checks for cpp/header files are done recursively from a directory iso the project
     # checks for missing files moved to checkvsproject.py since they are not c++ project specific.
 
-    for item_definition_group_node in project_root.iter(ns + 'ItemDefinitionGroup'):
-        # print (itemDefinitionGroupNode.tag + " " + itemDefinitionGroupNode.get("Condition"))
-        cl_compile_node = item_definition_group_node.find(ns + 'ClCompile')
-        if not cl_compile_node is None:
-            warning_as_error_node = cl_compile_node.find(ns + 'TreatWarningAsError')
-            if not warning_as_error_node is None:
-                # print (warningAsErrorNode.tag + " " + warningAsErrorNode.text)
-                if warning_as_error_node.text.lower() == "true":
-                    continue
+    missing_warning_as_error = 0
+    missing_warning_level = 0
+    for _event, element in ET.iterparse(projectname):
+        if element.tag == ns + 'ItemDefinitionGroup':
+            cl_compile_node = element.find(ns + 'ClCompile')
+            if not is_warning_as_error(cl_compile_node):
+                missing_warning_as_error += 1
+            if not is_warning_level_4(cl_compile_node):
+                missing_warning_level += 1
+            element.clear()
+        elif element.tag == ns + 'ItemGroup':
+            element.clear()
+
+    for _ in range(missing_warning_as_error):
         report_issue(projectname, "0", "UD#4", "redflag", "TreatWarningAsError is not set to true")
-
-    for item_definition_group_node in project_root.iter(ns + 'ItemDefinitionGroup'):
-        # print (itemDefinitionGroupNode.tag + " " + itemDefinitionGroupNode.get("Condition"))
-        cl_compile_node = item_definition_group_node.find(ns + 'ClCompile')
-        if not cl_compile_node is None:
-            warning_level = cl_compile_node.find(ns + 'WarningLevel')
-            if not warning_level is None:
-                # print (warningAsErrorNode.tag + " " + warningAsErrorNode.text)
-                if warning_level.text.endswith("4"):
-                    continue
+    for _ in range(missing_warning_level):
         report_issue(projectname, "0", "UD#5", "redflag", "Warning level is not set to 4")
 
 
-def get_projects_recursively(path):
-    result = []
-    for root, _dirs, files in gitignore_parser.walk(path, filenames=['.opencanaryignore']):
-        for file in files:
-            if file.endswith("proj"):
-                project = os.path.abspath(root + "\\" + file)
-                # print ("Found " + project)
-                result += [project]
-    return result
-
+# checks one project file and returns its issue lines, the task is a (projectname,) tuple like the c++ file tasks
+def check_project_file(task):
+    projectname = task[0]
+    try:
+        check_project(projectname)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except Exception:
+        # info = traceback.format_exc()
+        # eprint(info)                   # uncomment to debug parsing issues
+        # maybe related: https://stackoverflow.com/questions/31390213/how-to-parse-an-xml-file-with-encoding-declaration-in-python
+        report_issue(projectname, "0", "PARSE", "parse", "Could not parse project file")
+    return take_collected_issues()
+
+
+# yields the issue lines per project, in the order of the projects, also when the projects are checked in parallel
+def check_projects(projects, jobs, cache=None):
+    tasks = [(projectname,) for projectname in projects]
+    if cache is None:
+        return map_tasks(tasks, jobs, check_project_file)
+    check_function = functools.partial(check_with_signature, check_project_file)
+    return check_cached(tasks, cache, "project(s)", lambda misses: map_tasks(misses, jobs, check_function))
+
+
+# checks one header or source file and returns its issue lines in the order they were found
+# the task is a (filename, is_header) tuple so it can be mapped over a process pool
+def check_cpp_file(task):
+    filename, is_header = task
+    kind = "header" if is_header else "source"
+    try:
+        check_cpp_source(filename, is_header)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except Exception as e:
+        eprint(f"OC Error parsing {kind}:", filename, "\n", e, "\n\n")
+        report_issue(filename, "", "PARSE", "parse", f"Could not parse {kind} file")
+    return take_collected_issues()
+
+
+# yields the results of check_function per file, in the order of the tasks, also when the files are checked in parallel
+def check_cpp_files(tasks, jobs, check_function=check_cpp_file):
+    if scan_profile is not None:
+        check_function = functools.partial(check_cpp_file_profiled, check_function)
+    for result in map_tasks(tasks, jobs, check_function):
+        if scan_profile is not None:
+            result = scan_profile.add_file(*result)
+        yield result
+
+
+def map_tasks(tasks, jobs, function):
+    if jobs <= 1 or len(tasks) < 2:
+        for task in tasks:
+            yield function(task)
+        return
 
-def show_usage():
-    if len(sys.argv) > 1:
-        eprint("  I got:", sys.argv)
-        eprint("")
-    eprint(r"Usage: " + os.path.basename(__file__) + " <path>")
-    eprint(r"  <path>: location to search for c++ sources recursively")
-    eprint("")
+    chunksize = max(1, min(64, len(tasks) // (jobs * 8)))
+    with multiprocessing.Pool(jobs, initializer=set_max_line_length, initargs=(max_line_length,)) as pool:
+        yield from pool.imap(function, tasks, chunksize)
+
+
+# runs check_function with rule profiling enabled, this also happens in the worker processes
+def check_cpp_file_profiled(check_function, task):
+    global rule_profile
+    rule_profile = {}
+    start = time.perf_counter()
+    result = check_function(task)
+    seconds = time.perf_counter() - start
+    rules, rule_profile = rule_profile, None
+    return task[0], seconds, rules, result
+
+
+class ScanProfile:
+    """
+    Cumulative time, evaluations and hits per rule and the slowest files of a run
+    """
+
+    def __init__(self, slowest_count):
+        self.slowest_count = slowest_count
+        self.rules = {}
+        self.slowest_files = []  # min-heap of (seconds, filename)
+        self.file_count = 0
+        self.seconds = 0.0
+
+    def add_file(self, filename, seconds, rules, result):
+        self.file_count += 1
+        self.seconds += seconds
+        for rule, (rule_seconds, evaluations, hits) in rules.items():
+            entry = self.rules.setdefault(rule, [0.0, 0, 0])
+            entry[0] += rule_seconds
+            entry[1] += evaluations
+            entry[2] += hits
+        if len(self.slowest_files) < self.slowest_count:
+            heapq.heappush(self.slowest_files, (seconds, filename))
+        elif self.slowest_files and seconds > self.slowest_files[0][0]:
+            heapq.heapreplace(self.slowest_files, (seconds, filename))
+        return result
+
+    def write(self, filename):
+        rules = [{"rule": rule, "seconds": round(seconds, 6), "evaluations": evaluations, "hits": hits}
+                 for rule, (seconds, evaluations, hits) in self.rules.items()]
+        rules.sort(key=lambda entry: entry["seconds"], reverse=True)
+        files = [{"file": name, "seconds": round(seconds, 6)} for seconds, name in sorted(self.slowest_files, reverse=True)]
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({"files_checked": self.file_count, "seconds": round(self.seconds, 6),
+                       "rules": rules, "slowest_files": files}, f, indent=2)
+
+
+def get_file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def get_file_signature(filename):
+    stat = os.stat(filename)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# the options that change the issues found in a file, a cache made with other options is not used
+def get_check_options():
+    return {"max_line_length": max_line_length}
+
+
+# the rules are defined in this script and the issue format in util.py, changing either (or the options) invalidates the cache
+def get_ruleset_version(options):
+    digest = hashlib.sha1()
+    for module_file in [__file__, util.__file__]:
+        with open(module_file, 'rb') as f:
+            digest.update(f.read())
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ScanCache:
+    """
+    Persistent cache of the issue lines per file, keyed by path, content hash and rule-set version (including the options).
+    The content hash is only calculated when the size or mtime of a file changed.
+    Only the files looked up in this run are saved, so the entries of deleted or no longer checked files are dropped.
+    """
+
+    def __init__(self, filename, options):
+        self.filename = filename
+        self.version = get_ruleset_version(options)
+        self.entries = {}
+        self.seen = set()
+        self.hits = 0
+        if filename and os.path.isfile(filename):
+            try:
+                with open(filename, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.version:
+                    self.entries = data["files"]
+            except (ValueError, KeyError) as e:
+                eprint("ignoring unreadable cache", filename, ":", e)
+
+    def lookup(self, filename):
+        self.seen.add(filename)
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+        try:
+            signature = get_file_signature(filename)
+            if signature["size"] != entry["size"]:
+                return None
+            if signature["mtime_ns"] != entry["mtime_ns"]:
+                if get_file_hash(filename) != entry["sha1"]:
+                    return None
+                entry.update(signature)
+        except OSError:
+            return None
+        self.hits += 1
+        return entry["issues"]
+
+    def store(self, filename, signature, issues):
+        if signature is not None:
+            self.entries[filename] = dict(signature, issues=issues)
+
+    # with keep_unseen (a run that only checks some files) the entries of the other files that still exist are kept
+    def save(self, keep_unseen=False):
+        entries = {filename: entry for filename, entry in self.entries.items()
+                   if filename in self.seen or (keep_unseen and os.path.isfile(filename))}
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": entries}, f)
+        os.replace(temp_filename, self.filename)
+
+
+# like check_function(task), but also returns the signature of the file task[0] as it was before it was checked
+# the hash of a c++ file is calculated from the content open_source() reads for the check, so it is read once
+def check_with_signature(check_function, task):
+    global hash_sources, source_hash
+    filename = task[0]
+    try:
+        signature = get_file_signature(filename)
+    except OSError:
+        signature = None
+    hash_sources, source_hash = signature is not None, None
+    try:
+        result = check_function(task)
+    finally:
+        hash_sources = False
+    if signature is not None:
+        try:
+            signature["sha1"] = source_hash or get_file_hash(filename)
+        except OSError:
+            signature = None
+    return signature, result
+
+
+# yields the issue lines per task in the order of the tasks, only the tasks of which the file is not in the cache
+# are passed to check_misses, that yields a (signature, issue lines) tuple per task, see check_with_signature()
+def check_cached(tasks, cache, kind, check_misses):
+    cached_issues = [cache.lookup(task[0]) for task in tasks]
+    misses = [task for task, issues in zip(tasks, cached_issues) if issues is None]
+    eprint(len(tasks) - len(misses), "of", len(tasks), kind, "found in cache")
+    checked = check_misses(misses)
+    for task, issues in zip(tasks, cached_issues):
+        if issues is None:
+            signature, issues = next(checked)
+            cache.store(task[0], signature, issues)
+        yield issues
+
+
+def check_cpp_files_cached(tasks, jobs, cache):
+    check_function = functools.partial(check_with_signature, check_cpp_file)
+    return check_cached(tasks, cache, "c++ file(s)", lambda misses: check_cpp_files(misses, jobs, check_function))
+
+
+# one (filename, is_header) task per physical file, a file that is found through more than one path is checked once
+def get_cpp_tasks(headers, cpps):
+    tasks = []
+    seen = set()
+    for filenames, is_header in [(headers, True), (cpps, False)]:
+        for filename in filenames:
+            key = os.path.normcase(os.path.realpath(filename))
+            if key not in seen:
+                seen.add(key)
+                tasks.append((filename, is_header))
+    return tasks
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Checks c++ projects, headers and sources for common issues")
+    parser.add_argument('path', help="location to search for c++ sources recursively")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of processes used to check the projects and c++ files, 0 uses all cores, defaults to 1")
+    parser.add_argument('--changed-since', metavar="REF", default="",
+                        help="only check the files that changed compared to the git REF, for example origin/main...")
+    parser.add_argument('--profile', metavar="FILE", default="",
+                        help="write the time spent per rule and the slowest files as json to FILE")
+    parser.add_argument('--profile-files', metavar="N", type=int, default=20,
+                        help="number of slowest files in the --profile output, defaults to 20")
+    parser.add_argument('--max-line-length', metavar="N", type=int, default=max_line_length,
+                        help=f"lines longer than N characters are reported as skipped instead of checked, defaults to {max_line_length}")
+    parser.add_argument('--cache', default="",
+                        help="file to store the issues per c++ file in, unchanged files are not checked again in the next run")
+    parser.add_argument('--format', choices=["text", "bin"], default="text",
+                        help="write the issues as text (pipe-separated lines) or in the binary format, defaults to text")
+    args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or more")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    return args
 
 
 def read_ignore_file(ignorefile, basepath):
@@ -309,50 +878,44 @@ def read_ignore_file(ignorefile, basepath):
 
 
 def main():
-    if not len(sys.argv) == 2:
-        eprint("error: invalid argument(s)\n")
-        show_usage()
-        sys.exit(1)
-
-    check_spelling_AP19()
-
-    rootpath = os.path.abspath(sys.argv[1])
-
-    eprint("checking folder", rootpath, "(recursively)")
-    projects = get_projects_recursively(rootpath)
-    for project in projects:
-        # eprint("checking " + project)
-        try:
-            check_project(project)
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except:
-            # info = traceback.format_exc()
-            # eprint(info)                   # uncomment to debug parsing issues
-            # maybe related: https://stackoverflow.com/questions/31390213/how-to-parse-an-xml-file-with-encoding-declaration-in-python
-            report_issue(project, "0", "PARSE", "parse", "Could not parse project file")
-
-    headers, cpps = util.get_cpp_files_from_directory(rootpath)
-    for filename in headers:
-        try:
-            check_cpp_header_AP17(filename)
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except Exception as e:
-            eprint("OC Error parsing header:", filename, "\n", e, "\n\n")
-            report_issue(filename, "", "PARSE", "parse", "Could not parse header file")
-
-    for filename in cpps:
-        try:
-            check_cpp_source(filename)
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except Exception as e:
-            eprint("OC Error parsing source:", filename, "\n", e, "\n\n")
-            report_issue(filename, "", "PARSE", "parse", "Could not parse source file")
+    global scan_profile
+    args = parse_arguments()
+    util.output_format = args.format
+    if args.profile:
+        scan_profile = ScanProfile(args.profile_files)
+    set_max_line_length(args.max_line_length)
+
+    rootpath = os.path.abspath(args.path)
+
+    if args.changed_since:
+        changed_files = util.get_changed_files_from_directory(rootpath, args.changed_since)
+        eprint("checking", len(changed_files), "file(s) in", rootpath, "changed since", args.changed_since)
+        projects = [filename for filename in changed_files if filename.endswith("proj")]
+        headers, cpps = util.split_cpp_files(changed_files)
+    else:
+        eprint("checking folder", rootpath, "(recursively)")
+        files = util.get_files_from_directory(rootpath)
+        projects = [filename for filename in files if filename.endswith("proj")]
+        headers, cpps = util.split_cpp_files(files)
+
+    cache = ScanCache(os.path.abspath(args.cache), get_check_options()) if args.cache else None
+    for lines in check_projects(projects, args.jobs, cache):
+        print_issues(lines)
+
+    tasks = get_cpp_tasks(headers, cpps)
+    if cache is not None:
+        for lines in check_cpp_files_cached(tasks, args.jobs, cache):
+            print_issues(lines)
+        cache.save(keep_unseen=bool(args.changed_since))
+    else:
+        for lines in check_cpp_files(tasks, args.jobs):
+            print_issues(lines)
 
     sys.stdout.flush()
     eprint(str(len(projects)) + " msvc project(s) checked")
+    if scan_profile is not None:
+        scan_profile.write(args.profile)
+        eprint("profile written to", args.profile)
 
 
 if __name__ == "__main__":
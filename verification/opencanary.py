@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Runs a pipeline of opencanary stages in one process
+- the stages are chained as generators over the issues, instead of one interpreter per stage
+  that splits and joins every pipe-separated line again
+- the output is the same as the output of the same stages in a shell pipe
+
+usage: type build.log | opencanary.py run "parse_gcc.py gcc | apply_team_priorities.py | apply_low_hanging_fruit.py | sortby.py | create_report.py | apply_environment.py env.txt"
+
+"""
+
+import traceback
+import sys
+import os
+import shlex
+import argparse
+import util
+import parse_gcc
+import parse_msvc
+import apply_team_priorities
+import apply_codeowners
+import apply_low_hanging_fruit
+import sortby
+import create_report
+import apply_environment
+
+from util import eprint
+
+# what a stage reads and writes:
+# TEXT is a line of text (including the newline), as it is read from stdin
+# ISSUES are the fields of an issue, as read_structured_line() returns them
+# WRITTEN are the fields of an issue, as they are in the line written by report_list()
+TEXT = "text"
+ISSUES = "issues"
+WRITTEN = "written"
+
+
+def invalid_arguments(stage, args):
+    eprint(f"{stage}.py commandline error: invalid argument(s):", args)
+    sys.exit(1)
+
+
+def run_parse_gcc(lines, args):
+    if len(args) < 1:
+        invalid_arguments("parse_gcc", args)
+    return parse_gcc.read_issues(lines, args[0])
+
+
+def run_parse_msvc(lines, args):
+    if len(args) < 1:
+        invalid_arguments("parse_msvc", args)
+    return parse_msvc.read_issues(lines, args[0])
+
+
+def run_apply_team_priorities(issues, args):
+    if len(args) != 0:
+        invalid_arguments("apply_team_priorities", args)
+    return map(apply_team_priorities.transform, issues)
+
+
+def run_apply_codeowners(issues, args):
+    if len(args) not in [1, 2]:
+        invalid_arguments("apply_codeowners", args)
+    root = args[1] if len(args) == 2 else apply_codeowners.get_default_root(args[0])
+    codeowners = apply_codeowners.CodeOwners(args[0], root)
+    return (apply_codeowners.transform(issue, codeowners) for issue in issues)
+
+
+def run_apply_low_hanging_fruit(issues, args):
+    if len(args) != 0:
+        invalid_arguments("apply_low_hanging_fruit", args)
+    return apply_low_hanging_fruit.apply_low_hanging_fruit(list(issues))
+
+
+def run_sortby(issues, args):
+    if len(args) != 0:
+        invalid_arguments("sortby", args)
+    return sortby.sort_issues(issues)
+
+
+def run_create_report(issues, args):
+    limit = create_report.parse_limit(args)
+    if limit is None:
+        invalid_arguments("create_report", args)
+    return create_report.create_html_report(list(issues), limit).splitlines(keepends=True)
+
+
+def run_apply_environment(lines, args):
+    if len(args) != 1:
+        invalid_arguments("apply_environment", args)
+    util.read_envfile(args[0])
+    return map(apply_environment.transform, lines)
+
+
+# stage name: (input, output, function(input, arguments) that returns the output)
+stages = {
+    "parse_gcc": (TEXT, ISSUES, run_parse_gcc),
+    "parse_msvc": (TEXT, ISSUES, run_parse_msvc),
+    "apply_team_priorities": (ISSUES, ISSUES, run_apply_team_priorities),
+    "apply_codeowners": (ISSUES, ISSUES, run_apply_codeowners),
+    "apply_low_hanging_fruit": (ISSUES, ISSUES, run_apply_low_hanging_fruit),
+    "sortby": (WRITTEN, WRITTEN, run_sortby),
+    "create_report": (ISSUES, TEXT, run_create_report),
+    "apply_environment": (TEXT, TEXT, run_apply_environment),
+}
+
+
+# converts the output of a stage to the input of the next stage like the pipe in between would
+# the issues are passed as WRITTEN fields, so only a TEXT stage joins them into lines
+def convert(records, output, stage_input):
+    if output == stage_input and output != ISSUES:
+        return records
+    if output == TEXT:
+        records = (line.strip().split("|") for line in records)
+    elif output == ISSUES:
+        records = map(util.write_issue_fields, records)
+    if stage_input == TEXT:
+        return ("|".join(parts) + "\n" for parts in records)
+    if stage_input == ISSUES:
+        return map(util.read_issue_fields, records)
+    return records
+
+
+# splits "parse_gcc.py gcc | sortby.py" into [("parse_gcc", ["gcc"]), ("sortby", [])]
+def parse_pipeline(pipeline):
+    result = []
+    for command in pipeline.split("|"):
+        words = shlex.split(command)
+        if len(words) == 0:
+            eprint("empty stage in pipeline:", pipeline)
+            sys.exit(1)
+        name = os.path.basename(words[0])
+        if name.endswith(".py"):
+            name = name[:-3]
+        if name not in stages:
+            eprint(f"stage '{words[0]}' can not run in-process, supported are:", ", ".join(stages))
+            sys.exit(1)
+        result += [(name, words[1:])]
+    return result
+
+
+# runs the stages on the records of kind 'output' and returns the result as records of kind 'result'
+def run(pipeline, records, output=TEXT, result=TEXT):
+    for name, args in pipeline:
+        stage_input, next_output, function = stages[name]
+        records = function(convert(records, output, stage_input), args)
+        output = next_output
+    return convert(records, output, result)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Runs opencanary stages in one process")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_command = commands.add_parser('run', help="read stdin, run the stages and write the result to stdout")
+    run_command.add_argument('pipeline', nargs="+",
+                             help="the stages separated by '|', like the shell pipe, supported are: " + ", ".join(stages))
+    run_command.add_argument('--format', choices=["text", "bin"], default="text",
+                             help="write the issues as text (pipe-separated lines) or in the binary format, defaults to text")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    pipeline = parse_pipeline(" ".join(args.pipeline))
+
+    # a pipeline that starts with a stage that reads issues also reads the binary format
+    records, output = sys.stdin, TEXT
+    if stages[pipeline[0][0]][0] != TEXT:
+        records, output = util.read_written_fields(), WRITTEN
+
+    if args.format == "bin" and stages[pipeline[-1][0]][1] != TEXT:
+        for parts in run(pipeline, records, output, WRITTEN):
+            util.write_binary_fields(parts)
+    else:
+        sys.stdout.writelines(run(pipeline, records, output, TEXT))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BrokenPipeError:   # still makes piping into 'head -n' work nicely
+        sys.stderr.close()
+        sys.exit(0)
+    except:
+        info = traceback.format_exc()
+        eprint(info)
+        sys.exit(1)
@@ -37,7 +37,7 @@ def create_default_link(filename, line):
 # eg. file:   /component/inc/foo.h:127:23
 #     filename:  /component/inc/foo.h
 #     line:      127
-def report_issue(file, filename, line, source, rule, category, description):
+def create_gcc_issue(file, filename, line, source, rule, category, description):
     links = create_default_link(filename, line)
 
     if is_valid_rule(rule):
@@ -47,7 +47,7 @@ def report_issue(file, filename, line, source, rule, category, description):
     component = ""
     if rule == "cmdline":
         component = "compiler"
-    report(Priority.UNASSIGNED.value, team, component, file, source, rule, category, description, links)
+    return create_issue(Priority.UNASSIGNED.value, team, component, file, source, rule, category, description, links)
 
 
 def split_warning_line(line):
@@ -65,12 +65,12 @@ def split_warning_line(line):
 # file.cc:985:30: warning: cast from 'char *' to 'int *' [-Wcast-align]
 # executor.cc:190:5: warning: variable 'id' of type 'unsigned int' can be declared 'const' [misc-const-correctness]
 # notice the rule-specifier in warnings from clang not always start with '-W'
-#
+# returns the issue, or None for lines that are not a warning
 def parse(line, source):
     rule = "rule-missing"
     category = "warning"
     if "this will be reported only once per input file" in line:
-        return
+        return None
     if "uninitialized" in line:
         rule = "uninitialized"
     if "not used" in line:
@@ -87,7 +87,15 @@ def parse(line, source):
             rule = remainder[last_bracket_index:].strip("]").strip("[")
             if rule.startswith("-W"):
                 rule = rule[2:]
-        report_issue(file, filename, line, source, rule, category, description)
+        return create_gcc_issue(file, filename, line, source, rule, category, description)
+    return None
+
+
+def read_issues(lines, source):
+    for line in lines:
+        issue = parse(line.strip(), source)
+        if issue is not None:
+            yield issue
 
 
 def show_usage():
@@ -95,18 +103,20 @@ def show_usage():
     eprint(r"Usage: type <filename> | " + os.path.basename(__file__) + " <sourcename>")
     eprint(r"  the standard input (captured data from gcc) is transformed to opencanary format")
     eprint(r"  <sourcename> a name that identifies where input came from eg. gcc, clang or a specific build_type)")
+    eprint(r"  --format=bin writes the issues in the binary format instead of text")
     eprint("")
 
 
 def main():
+    apply_format_argument()
     if len(sys.argv) < 2:
         eprint(os.path.basename(__file__) + " commandline error: invalid argument(s)\n")
         show_usage()
         sys.exit(1)
 
     source = sys.argv[1]
-    for line in sys.stdin:
-        parse(line.strip(), source)
+    for issue in read_issues(sys.stdin, source):
+        report_list(issue)
 
 
 if __name__ == "__main__":
@@ -7,53 +7,22 @@ import traceback
 import sys
 import os
 import pathlib
+import functools
 from util import *
 
 
+# the priorities per rule, see msvc_priorities.txt
+priority_table = None
+
+
 def get_priority(rule):
-    if "C4100" in rule:
-        return 70
-    if "C4127" in rule:
-        return 15
-    if "C4211" in rule:
-        return 20
-    if "C4239" in rule:
-        return 20
-    if "C4244" in rule:
-        return 40
-    if "C4245" in rule:
-        return 50
-    if "C4310" in rule:
-        return 15
-    if "C4324" in rule:
-        return 20
-    if "C4389" in rule:
-        return 50
-    if "C4456" in rule:
-        return 10
-    if "C4457" in rule:
-        return 10
-    if "C4458" in rule:
-        return 10
-    if "C4499" in rule:
-        return 55
-    if "C4505" in rule:
-        return 60
-    if "C4611" in rule:
-        return 60
-    if "C4505" in rule:
-        return 60
-    if "C4611" in rule:
-        return 20
-    if "C4701" in rule:
-        return 16
-    if "C4706" in rule:
-        return 30
-    if "C4714" in rule:
-        return 17
-    if "C4918" in rule:
-        return 5
-    return Priority.UNSET.value
+    global priority_table
+    if priority_table is None:
+        priority_table = RuleTable(os.path.join(os.path.dirname(os.path.abspath(__file__)), "msvc_priorities.txt"), ("priority",))
+    priority = priority_table.lookup(rule)[0]
+    if priority is None:
+        return Priority.UNSET.value
+    return int(priority)
 
 
 def could_not_resolve(filename):
@@ -65,10 +34,14 @@ def could_not_resolve(filename):
     eprint("--- Could not resolve:", filename, "(can be ignored when running without source files present)")
 
 
+# the number of filenames resolve_filename() remembers, one central header can occur 50k times in a log
+resolve_filename_cache_size = 16384
+
+
 # this gets the filename as it is actually stored on the filesystem, with correct capitalization
-def get_real_filename(filename):
-    if not on_ci_server():
-        return filename
+# the result is remembered, also for a file that does not exist, so it is only looked up (and reported) once
+@functools.lru_cache(maxsize=resolve_filename_cache_size)
+def resolve_filename(filename):
     fs_filename = filename
     if os.path.isfile(filename):
         fs_filename = str(pathlib.Path(filename).resolve())
@@ -77,6 +50,20 @@ def get_real_filename(filename):
     return fs_filename.replace('\\', '/')
 
 
+def get_real_filename(filename):
+    if not on_ci_server():
+        return filename
+    return resolve_filename(filename)
+
+
+def report_filename_cache():
+    info = resolve_filename.cache_info()
+    lookups = info.hits + info.misses
+    if lookups > 0:
+        eprint(f"--- Resolved {lookups} filename(s), {info.hits} from the cache ({info.hits / lookups:.1%}),",
+               f"{info.misses} on the filesystem")
+
+
 # splits a line in two parts, if the separator is not found the second part is empty
 def split_two(line, separator):
     parts = line.split(separator, 1)
@@ -117,20 +104,21 @@ def split_message_line(line):
     return filepart, line, "", description, component
 
 
-def report_issue(component, fileref, source, rule, category, description):
+def create_msvc_issue(component, fileref, source, rule, category, description):
     links = create_link(Column.SOURCE.value, get_feeling_ducky_url(rule))
-    report(str(get_priority(rule)), "[[team]]", component, fileref, source, rule, category, description, links)
+    return create_issue(str(get_priority(rule)), "[[team]]", component, fileref, source, rule, category, description, links)
 
 
+# returns the issue, or None for lines that are not a warning
 def parse_msvc(line, source):
     if line.startswith(" "):  # strip out notes
-        return
+        return None
     if ": message" in line:
         # message lines sometimes seem to contain ": warning", this seem to be caused by compilers writing interleaved to stdout ??
-        return
+        return None
     if "class template optional is only available with C++17 or later." in line:
         # workaround bug where this warning is falsely reported on an unrelated line
-        return
+        return None
 
     line = line.strip()
 
@@ -139,8 +127,7 @@ def parse_msvc(line, source):
     if ": warning" in line:
         fileref, filename, line, rule, description = split_warning_line(line)
         component = ""
-        report_issue(component, fileref, source, rule, "warning", description)
-        return
+        return create_msvc_issue(component, fileref, source, rule, "warning", description)
     # if ": message" in line:
     #    filename, line, rule, description, component = split_message_line(line)
     #    reportIssue(filename, line, rule, description, component, "message")
@@ -160,8 +147,16 @@ def parse_msvc(line, source):
         component = "compiler"
         category = "cmdline"
 
-        report_issue(component, fileref, source, rule, category, description)
-        return
+        return create_msvc_issue(component, fileref, source, rule, category, description)
+    return None
+
+
+def read_issues(lines, source):
+    for line in lines:
+        issue = parse_msvc(line.strip(), source)
+        if issue is not None:
+            yield issue
+    report_filename_cache()
 
 
 def show_usage():
@@ -169,18 +164,20 @@ def show_usage():
     eprint(r"Usage: type <filename> | " + os.path.basename(__file__) + " <sourcename>")
     eprint(r"  the standard input (captured data from msvc) is transformed to opencanary format")
     eprint(r"  <sourcename> a name that identifies where input came from eg. a specific build_type)")
+    eprint(r"  --format=bin writes the issues in the binary format instead of text")
     eprint("")
 
 
 def main():
+    apply_format_argument()
     if len(sys.argv) < 2:
         eprint(os.path.basename(__file__) + " commandline error: invalid argument(s)\n")
         show_usage()
         sys.exit(1)
 
     source = sys.argv[1]
-    for line in sys.stdin:
-        parse_msvc(line.strip(), source)
+    for issue in read_issues(sys.stdin, source):
+        report_list(issue)
 
 
 if __name__ == "__main__":
@@ -3,8 +3,7 @@
 """
 
 import os, sys, traceback, re
-import gitignore_parser, subprocess
-from subprocess import Popen, PIPE
+import util, subprocess
 
 # commandline argument used require clang-format-11 or better
 CLANG_FMT_BINARY = r"clang-format-11"
@@ -28,13 +27,11 @@ def get_cpp_files_from_directory(path):
     headers = []
     cpps = []
 
-    for root, dirs, files in gitignore_parser.walk(rootpath, filenames=['.gitignore', '.clang-format-ignore']):
-        for file in files:
-            abs_filename = os.path.abspath(os.path.join(root, file))
-            if is_cpp_header(file):
-                headers += [abs_filename]
-            if is_cpp_source(file):
-                cpps += [abs_filename]
+    for abs_filename in util.get_files_from_directory(rootpath, ['.gitignore', '.clang-format-ignore']):
+        if is_cpp_header(abs_filename):
+            headers += [abs_filename]
+        if is_cpp_source(abs_filename):
+            cpps += [abs_filename]
     return headers, cpps
 
 
@@ -7,15 +7,13 @@
 import os
 import sys
 import traceback
+import util
 from util import Column
 from util import eprint
-from util import sprint
 
 
 # the tuple is used for a lexicographically sort by its fields
-def make_tuple(line):
-    data = line.split("|")
-
+def make_tuple(data):
     # sort the first column by its integer-representation, column[0] (prio) and column[3] (filename)
     # bug: we should sort also by the line-number and column-number at the end of the "filename:line:column"
 
@@ -32,29 +30,26 @@ def make_tuple(line):
     return int(data[Column.PRIO]), filename, int(line_number), int(column_number)
 
 
-def sort_by(inputlines):
-    return sorted(inputlines, key=make_tuple)
-
-
-def get_stdin_lines():
-    lines = []
-    for line in sys.stdin:
-        lines += [line.strip()]
-    return lines
+# sorts the issues split into their fields, of the duplicates the first one is kept
+# so issues that sort equal keep their order
+def sort_issues(issues):
+    return [list(parts) for parts in sorted(dict.fromkeys(map(tuple, issues)), key=make_tuple)]
 
 
 def show_usage():
     eprint(r"Usage: type <file> | " + os.path.basename(__file__))
     eprint(r"  will sort the input from stdin and filter out all duplicate entries")
+    eprint(r"  --format=bin writes the issues in the binary format instead of text")
 
 
 def main():
+    util.apply_format_argument()
     if len(sys.argv) > 1:
         show_usage()
         sys.exit(1)
 
-    for line in sort_by(set(get_stdin_lines())):
-        sprint(line)
+    for parts in sort_issues(util.read_written_fields()):
+        util.write_written_fields(parts)
 
 
 if __name__ == "__main__":
@@ -13,13 +13,6 @@ from util import eprint, Column
 verbose = False
 
 
-def read():
-    results = []
-    for line in sys.stdin:
-        results += [util.read_structured_line(line)]
-    return results
-
-
 issue_descriptions = {}
 
 def limit_string_at_whitespace(input_string, max_length=100):
@@ -48,9 +41,12 @@ def add_description(rule, parts):
     # issue_descriptions[rule] = "[" + parts[Column.Component] + "]: " + parts[Column.Link]
 
 
+# returns the number of issues per rule and the total number of issues, the issues are counted as they are read
 def count_rules(lines):
     results = {}
+    line_count = 0
     for parts in lines:
+        line_count += 1
         util.check_structured_line_parts(parts)
         rule = parts[Column.RULE]
         add_description(rule, parts)
@@ -58,7 +54,7 @@ def count_rules(lines):
             results[rule] = results[rule] + 1
         else:
             results[rule] = 1
-    return results
+    return results, line_count
 
 
 def get_description(rule):
@@ -81,9 +77,9 @@ def main():
         verbose = True
 
     print("Summary of all issues:")
-    lines = read()
+    rules, line_count = count_rules(util.read_issues())
     check_len = 0
-    for rule, count in sorted(count_rules(lines).items(), key=lambda item: (item[1], item[0])):
+    for rule, count in sorted(rules.items(), key=lambda item: (item[1], item[0])):
         check_len += count
         if rule == "rule-missing":
             eprint("-- warning: ignored issue with rule-missing!")
@@ -91,8 +87,8 @@ def main():
         warning = f"{rule}: {count}"
         print(f"{warning:50}: {get_description(rule)}")
 
-    if check_len != len(lines):
-        print(f"error in script: {len(lines)}/{check_len} issues accounted for.")
+    if check_len != line_count:
+        print(f"error in script: {line_count}/{check_len} issues accounted for.")
     print(f"In total {check_len} issues.")
 
 
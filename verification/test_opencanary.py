@@ -2,13 +2,26 @@
 """ unittest for open canary
 """
 
+import io
 import os
+import sys
+import json
+import random
+import subprocess
+import tempfile
+import time
+import threading
 
 from xml.sax.handler import ContentHandler
 from xml.sax import make_parser
 
 import unittest
-from util import eprint
+import oc_cpp_issues
+import gitignore_parser
+import inventory
+import util
+from util import eprint, Column
+from issue_filter import IssueFilter
 
 
 def is_valid_xml_file(file):
@@ -86,5 +99,731 @@ class TestParseGcc(unittest.TestCase):
         self.assertTrue(is_valid_xml_file("test_result.txt"))
 
 
+sample_header = r'''#pragma once
+using namespace std;
+#define _Foo 1
+#define max(a,b) ((a)>(b)?(a):(b))
+extern int x;
+extern "C" void f();
+// deze comment is niet english
+int *p = NULL ;
+char* s = (char*)"literal";
+auto v = make_unique<int>(1);
+auto r = reinterpret_cast<int*>(p);
+if (a = b) {}
+delete ptr;
+#if 0
+#endif
+'''
+
+
+def write_file(filename, content):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def create_sample_tree(path):
+    for index in range(12):
+        write_file(os.path.join(path, "inc", f"header{index}.h"), sample_header)
+        write_file(os.path.join(path, "src", f"source{index}.cpp"), sample_header.replace("using", "// using"))
+    write_file(os.path.join(path, "ignored", "ignored.cpp"), sample_header)
+    write_file(os.path.join(path, ".opencanaryignore"), "ignored/\n")
+
+
+def run_script(args, env=None):
+    if env is not None:
+        env = dict(os.environ, **env)
+    result = subprocess.run([sys.executable] + args, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+    return result.stdout
+
+
+class TestOcCppIssues(unittest.TestCase):
+
+    def test_parallel_output_is_identical(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            sequential = run_script(["oc_cpp_issues.py", path])
+            parallel = run_script(["oc_cpp_issues.py", path, "--jobs", "3"])
+
+        self.assertEqual(sequential, parallel)
+        self.assertIn("|AP#17|", sequential)
+        self.assertNotIn("ignored.cpp", sequential)
+
+    def test_cache_replays_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            cache = os.path.join(path, "cache.json")
+            first = run_script(["oc_cpp_issues.py", path, "--cache", cache])
+            second = run_script(["oc_cpp_issues.py", path, "--cache", cache])
+            self.assertEqual(first, second)
+
+            write_file(os.path.join(path, "src", "source3.cpp"), "int* p = NULL ;\n")
+            cached = run_script(["oc_cpp_issues.py", path, "--cache", cache])
+            uncached = run_script(["oc_cpp_issues.py", path])
+
+        self.assertEqual(cached, uncached)
+        self.assertNotEqual(first, cached)
+
+    def test_cache_depends_on_the_options(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_file(os.path.join(path, "src", "long.cpp"), "char* " + "p" * 150 + " = (char *)q;\n")
+            cache = os.path.join(path, "cache.json")
+            short = run_script(["oc_cpp_issues.py", path, "--cache", cache, "--max-line-length", "100"])
+            self.assertIn("|SKIPPED|", short)
+            cached = run_script(["oc_cpp_issues.py", path, "--cache", cache])
+            uncached = run_script(["oc_cpp_issues.py", path])
+
+        self.assertEqual(cached, uncached)
+        self.assertIn("|AP#8|", cached)
+        self.assertNotIn("|SKIPPED|", cached)
+
+    def test_cache_keeps_only_the_checked_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            utf16 = os.path.join(path, "src", "utf16.cpp")
+            with open(utf16, "wb") as f:
+                f.write("int* p = NULL;\n".encode("utf-16"))
+            cache = os.path.join(path, "cache.json")
+            run_script(["oc_cpp_issues.py", path, "--cache", cache])
+            removed = os.path.join(path, "src", "source3.cpp")
+            os.remove(removed)
+            run_script(["oc_cpp_issues.py", path, "--cache", cache])
+            with open(cache, encoding="utf-8") as f:
+                entries = json.load(f)["files"]
+
+            self.assertEqual(len(entries), 24)
+            self.assertNotIn(removed, entries)
+            # the hash is calculated from the content as it is on disk, also when the check decodes it
+            for filename in [os.path.join(path, "src", "source4.cpp"), utf16]:
+                self.assertEqual(entries[filename]["sha1"], oc_cpp_issues.get_file_hash(filename))
+
+    def test_projects(self):
+        def project(item_definition_groups):
+            return ("<Project xmlns='http://schemas.microsoft.com/developer/msbuild/2003'>" +
+                    "".join(f"<ItemDefinitionGroup><ClCompile>{group}</ClCompile></ItemDefinitionGroup>" for group in item_definition_groups) +
+                    "</Project>")
+
+        with tempfile.TemporaryDirectory() as path:
+            write_file(os.path.join(path, "a", "good.vcxproj"),
+                       project(["<TreatWarningAsError>true</TreatWarningAsError><WarningLevel>Level4</WarningLevel>"] * 2))
+            write_file(os.path.join(path, "b", "bad.vcxproj"),
+                       project(["<WarningLevel>Level3</WarningLevel>", "<TreatWarningAsError>true</TreatWarningAsError>"]))
+            write_file(os.path.join(path, "c", "broken.vcxproj"), "<Project>")
+            cache = os.path.join(path, "cache.json")
+            output = run_script(["oc_cpp_issues.py", path])
+            self.assertEqual(output, run_script(["oc_cpp_issues.py", path, "--jobs", "2", "--cache", cache]))
+            self.assertEqual(output, run_script(["oc_cpp_issues.py", path, "--jobs", "2", "--cache", cache]))
+
+        issues = [line.split("|") for line in output.splitlines()]
+        # the directories are walked in file system order, the issues of a project are in rule order
+        self.assertEqual(sorted([(os.path.basename(issue[Column.FILE]), issue[Column.RULE]) for issue in issues], key=lambda issue: issue[0]),
+                         [("bad.vcxproj:0", "UD#4"), ("bad.vcxproj:0", "UD#5"), ("bad.vcxproj:0", "UD#5"),
+                          ("broken.vcxproj:0", "PARSE")])
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            profile = os.path.join(path, "profile.json")
+            output = run_script(["oc_cpp_issues.py", path, "--jobs", "2", "--profile", profile, "--profile-files", "5"])
+            self.assertEqual(output, run_script(["oc_cpp_issues.py", path]))
+            with open(profile, encoding="utf-8") as f:
+                data = json.load(f)
+
+        self.assertEqual(data["files_checked"], 24)
+        self.assertEqual(len(data["slowest_files"]), 5)
+        rules = {entry["rule"]: entry for entry in data["rules"]}
+        self.assertEqual(rules["AP#8"]["hits"], output.count("|AP#8|"))
+
+    def test_legacy_encodings_and_line_endings(self):
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, "legacy.cpp")
+            with open(filename, "wb") as f:
+                f.write(b"// caf\xe9\r\nint a;\r\nint* p = NULL ;\r\nvoid f(int* = NULL )")
+            issues = [issue.split("|") for issue in oc_cpp_issues.check_cpp_file((filename, False))]
+
+        self.assertEqual([issue[Column.RULE] for issue in issues], ["MO#5", "MO#5"])
+        self.assertEqual([issue[Column.FILE] for issue in issues], [filename + ":3", filename + ":4"])
+
+    def check_rules(self, source):
+        lines, _comments = oc_cpp_issues.read_source_lines(source.encode("utf-8"), oc_cpp_issues.source_code_trigger)
+        for line_number, code, comment in lines:
+            oc_cpp_issues.check_line_impl("file.cpp", str(line_number), code, comment, oc_cpp_issues.source_rules)
+        return [issue.split("|")[Column.RULE] for issue in oc_cpp_issues.take_collected_issues()]
+
+    def test_rules(self):
+        self.assertEqual(self.check_rules("    return value;\n"), [])
+        self.assertEqual(self.check_rules("auto v = make_unique<int>(1);\n"), ["MO#2"])
+        self.assertEqual(self.check_rules("auto v = std::make_unique<int>(1);\n"), [])
+        self.assertEqual(self.check_rules("#include \"foo/make_unique.h\"\n"), ["MO#1"])
+        self.assertEqual(self.check_rules("  extern volatile int y;\n"), ["AP#4", "AP#11", "AP#14"])
+        self.assertEqual(self.check_rules("#define MAX(a,b) ((a)<(b)?(b):(a))\n"), ["AP#10"])
+        self.assertEqual(self.check_rules("if (a = b) delete p;\n"), ["AP#13", "AP#18"])
+        self.assertEqual(self.check_rules("// de NAAM van de selectie\n"), ["AP#6"])
+
+    def test_rules_ignore_comments_and_literals(self):
+        self.assertEqual(self.check_rules("  int x; // extern int y; delete p;\n"), [])
+        self.assertEqual(self.check_rules("/* first line\n  extern volatile int y;\n*/\n"), [])
+        self.assertEqual(self.check_rules("  puts(\"extern int x; delete p;\");\n"), [])
+        self.assertEqual(self.check_rules("  auto s = R\"x(delete p; )\" // )x\"; f( NULL );\n"), ["MO#5"])
+        self.assertEqual(self.check_rules("  char c = '\"'; extern int y; // als\n"), ["AP#6", "AP#11"])
+        self.assertEqual(self.check_rules("  auto naam = \"deze\";\n"), [])
+
+        lines, comments = oc_cpp_issues.read_source_lines(b"int x; /* a\nb */ int y; // c\n", oc_cpp_issues.source_code_trigger)
+        self.assertEqual(comments, b"       /* a\nb */        // c\n")
+
+    def test_trailing_whitespace_of_code_is_kept(self):
+        self.assertEqual(self.check_rules("  extern  \n  int x;\n"), ["AP#11"])
+        self.assertEqual(self.check_rules("  extern  // comment\n  int x;\n"), ["AP#11"])
+        self.assertEqual(self.check_rules("  extern// comment\n"), [])
+
+        lines, _comments = oc_cpp_issues.read_source_lines(b"f(NULL);  /* a\nb */ f(NULL); // c\n", oc_cpp_issues.source_code_trigger)
+        self.assertEqual(lines, [(1, "f(NULL);  \n", ""), (2, "     f(NULL); \n", "")])
+
+        oc_cpp_issues.check_line_impl("file.cpp", "1", "#define max(a,b) ((a)>(b)?(a):(b))  \n", "", oc_cpp_issues.source_rules)
+        issues = [issue.split("|") for issue in oc_cpp_issues.take_collected_issues()]
+        self.assertEqual([issue[Column.DESCRIPTION] for issue in issues],
+                         ["Anti-pattern: do not define max(a,b) ((a)&gt;(b)?(a):(b))  , use std::min and std::max"])
+
+    def test_header_only_rules(self):
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, "file.h")
+            write_file(filename, "using namespace std;\n  extern int x;\n// using namespace std;\n")
+            header = [issue.split("|")[Column.RULE] for issue in oc_cpp_issues.check_cpp_file((filename, True))]
+            source = [issue.split("|")[Column.RULE] for issue in oc_cpp_issues.check_cpp_file((filename, False))]
+            self.assertEqual(header, ["AP#17", "AP#11"])
+            self.assertEqual(source, ["AP#11"])
+
+            tasks = oc_cpp_issues.get_cpp_tasks([filename, os.path.join(path, ".", "file.h")], [filename])
+            self.assertEqual(tasks, [(filename, True)])
+
+    def test_pathological_lines(self):
+        self.assertEqual(self.check_rules("#define " + "min(" * 500 + "\n"), [])
+        self.assertEqual(self.check_rules("#define " + "min(" * 500 + ":\n"), ["AP#10"])
+        self.assertEqual(self.check_rules("if (" * 300 + " = " * 300 + "\n"), [])
+
+        oc_cpp_issues.check_line("file.cpp", 1, "(" * (oc_cpp_issues.max_line_length + 1), "", oc_cpp_issues.source_rules)
+        issues = [issue.split("|") for issue in oc_cpp_issues.take_collected_issues()]
+        self.assertEqual([(issue[Column.RULE], issue[Column.CATEGORY]) for issue in issues], [("SKIPPED", "skipped")])
+
+    def test_raw_strings(self):
+        self.assertEqual(self.check_rules("  auto s = u8R\"x(delete p; )\" )x\"; f( NULL );\n"), ["MO#5"])
+        self.assertEqual(self.check_rules("  auto s = R\"(\n  extern int x;\n"), [])
+        # an R at the end of an identifier does not start a raw string
+        self.assertEqual(self.check_rules("  int FOOR\"(x); extern int y;\n"), ["AP#11"])
+
+        # every unterminated raw string used to be searched to the end of the file
+        data = "".join(f"int FOO{index}R\"(x);\n" for index in range(25000)) + "auto s = R\"(x);\n" * 1000
+        start = time.perf_counter()
+        oc_cpp_issues.read_source_lines(data.encode("utf-8"), oc_cpp_issues.source_code_trigger)
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def test_spelling(self):
+        oc_cpp_issues.check_spelling_AP19("file.cpp", b"int wich_one;\n// we recieve it untill\n")
+        issues = [issue.split("|") for issue in oc_cpp_issues.take_collected_issues()]
+        self.assertEqual([issue[Column.FILE] for issue in issues], ["file.cpp:2", "file.cpp:2"])
+        self.assertEqual([issue[Column.RULE] for issue in issues], ["AP#19", "AP#19"])
+
+
+def walk_files(path, filenames):
+    result = []
+    for root, _dirs, files in gitignore_parser.walk(path, filenames=filenames):
+        result += [os.path.join(root, file) for file in files]
+    return result
+
+
+# the rules applied one by one, like is_included() did before the rules were compiled
+def reference_is_included(abs_path, rules, is_dir):
+    included = True
+    for rule in rules:
+        if rule.directory_only and not is_dir:
+            continue
+        if included != rule.negation and rule.match(abs_path):
+            included = not included
+    return included
+
+
+def create_ignore_patterns(count, seed):
+    generator = random.Random(seed)
+    names = ["src", "build", "gen", "test", "foo", "bar", "a", "b", "main.cpp", "util.h", "x.txt"]
+    extensions = ["cpp", "h", "txt", "o", "py"]
+    patterns = []
+    for _ in range(count):
+        name = generator.choice(names)
+        pattern = generator.choice([
+            name, name + "/", "/" + name, "*." + generator.choice(extensions), name + "*",
+            generator.choice(names) + "/" + name, "**/" + name, generator.choice(names) + "/**/" + name,
+            name + "/**", "[ab]", "?" + name, "# comment", "", "*", "**", "*" + name])
+        if generator.random() < 0.2:
+            pattern = "!" + pattern
+        patterns.append(pattern)
+    return patterns
+
+
+class TestGitignoreParser(unittest.TestCase):
+
+    def test_compiled_rules_match_rule_by_rule(self):
+        names = ["src", "build", "gen", "test", "foo", "bar", "a", "b", "main.cpp", "util.h", "x.txt", "mybuild", "ab.o"]
+        generator = random.Random(1)
+        paths = ["/" + "/".join(generator.choice(names) for _ in range(generator.randint(1, 5))) for _ in range(200)]
+        for seed in range(3):
+            root_rules = [gitignore_parser.rule_from_pattern(pattern, "/", source=("root", index))
+                          for index, pattern in enumerate(create_ignore_patterns(2000, seed))]
+            src_rules = [gitignore_parser.rule_from_pattern(pattern, "/src", source=("src", index))
+                         for index, pattern in enumerate(create_ignore_patterns(200, seed + 100))]
+            root_rules = [rule for rule in root_rules if rule]
+            src_rules = root_rules + [rule for rule in src_rules if rule]
+            for rules, directory in [(root_rules, "/"), (src_rules, "/src/")]:
+                matcher = gitignore_parser.CompiledRules(rules)
+                for path in [path for path in paths if path.startswith(directory)]:
+                    for is_dir in [True, False]:
+                        self.assertEqual(matcher.is_included(path, is_dir), reference_is_included(path, rules, is_dir),
+                                         (seed, path, is_dir))
+
+    def test_literal_suffix_rules(self):
+        suffixes = {pattern: gitignore_parser.rule_from_pattern(pattern, "/").suffix
+                    for pattern in ["build", "build/", "*.h", "**/x.txt", "!gen", "src/a", "a*", "*", "x?", "[ab]"]}
+        self.assertEqual(suffixes, {"build": "build", "build/": "build", "*.h": ".h", "**/x.txt": "x.txt", "!gen": "gen",
+                                    "src/a": None, "a*": None, "*": None, "x?": None, "[ab]": None})
+
+        rules = [gitignore_parser.rule_from_pattern(pattern, "/") for pattern in ["*.h", "!keep*", "gen/", "!*.h"]]
+        matcher = gitignore_parser.CompiledRules(rules)
+        self.assertEqual(matcher.last_match("/src/keep.h", is_dir=False).pattern, "!*.h")
+        self.assertEqual(matcher.last_match("/src/mygen", is_dir=True).pattern, "gen/")
+        self.assertIsNone(matcher.last_match("/src/mygen", is_dir=False))
+        self.assertEqual(matcher.last_match("/src/keep.cpp", is_dir=False).pattern, "!keep*")
+
+    def test_walk_applies_the_rules_of_all_ancestors(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_file(os.path.join(path, "a", ".opencanaryignore"), "*.h\n")
+            write_file(os.path.join(path, "a", "b", ".opencanaryignore"), "!keep.h\n")
+            for directory in ["a", "a/b", "a/b/c", "a/b/c/d"]:
+                write_file(os.path.join(path, directory, "file.h"), "")
+                write_file(os.path.join(path, directory, "keep.h"), "")
+                write_file(os.path.join(path, directory, "file.cpp"), "")
+            walked = [os.path.relpath(file, path) for file in walk_files(path, ['.opencanaryignore'])]
+            filtered = [os.path.relpath(file, path) for file in
+                        gitignore_parser.filter_paths(path, [os.path.relpath(file, path) for file in walk_files(path, [])],
+                                                      filenames=['.opencanaryignore'])]
+
+        self.assertEqual(sorted(walked), sorted(filtered))
+        self.assertEqual(sorted(file for file in walked if file.endswith(".h")),
+                         [os.path.join("a", "b", "c", "d", "keep.h"), os.path.join("a", "b", "c", "keep.h"), os.path.join("a", "b", "keep.h")])
+
+    def test_walk_parallel_matches_walk(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            write_file(os.path.join(path, "src", ".opencanaryignore"), "source1*\n")
+            for index in range(20):
+                write_file(os.path.join(path, "deep", *[f"level{level}" for level in range(index % 6)], f"file{index}.cpp"), "")
+            os.symlink(os.path.join(path, "src"), os.path.join(path, "deep", "link"))
+            walked = list(gitignore_parser.walk(path, filenames=['.opencanaryignore']))
+            walked_parallel = list(gitignore_parser.walk_parallel(path, filenames=['.opencanaryignore'], threads=4))
+
+        self.assertEqual(walked, walked_parallel)
+        self.assertIn("link", walked[[os.path.basename(root) for root, _dirs, _files in walked].index("deep")][1])
+
+    def test_filter_paths_matches_walk(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            write_file(os.path.join(path, "src", ".opencanaryignore"), "source1*\n*.h\n")
+            write_file(os.path.join(path, "src", "keep.h"), "")
+            walked = walk_files(path, ['.opencanaryignore'])
+            all_files = walk_files(path, [])
+            relative_files = [os.path.relpath(file, path) for file in all_files]
+            filtered = gitignore_parser.filter_paths(path, relative_files, filenames=['.opencanaryignore'])
+
+        self.assertEqual(sorted(walked), sorted(filtered))
+        self.assertLess(len(walked), len(all_files))
+
+
+def git(path, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "-c", "commit.gpgsign=false"] + list(args),
+                   cwd=path, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class TestChangedFiles(unittest.TestCase):
+
+    def create_repository(self, path):
+        git(path, "init", "-q")
+        for name in ["main.cpp", "src/changed.cpp", "src/deleted.cpp", "src/renamed.cpp", "src/same.cpp",
+                     "src/generated/changed.cpp", "ignored/changed.cpp"]:
+            write_file(os.path.join(path, name), f"// {name}\nint x;\n")
+        write_file(os.path.join(path, ".opencanaryignore"), "ignored/\n")
+        write_file(os.path.join(path, "src", ".opencanaryignore"), "generated/\n")
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", "initial")
+
+        for name in ["main.cpp", "src/changed.cpp", "src/generated/changed.cpp", "ignored/changed.cpp"]:
+            write_file(os.path.join(path, name), "char* s = (char*)q;\n")
+        os.remove(os.path.join(path, "src", "deleted.cpp"))
+        git(path, "mv", os.path.join("src", "renamed.cpp"), os.path.join("src", "new name.cpp"))
+        write_file(os.path.join(path, "src", "added ü.cpp"), "int y;\n")
+        write_file(os.path.join(path, "src", "untracked.cpp"), "int z;\n")
+        git(path, "add", os.path.join("src", "added ü.cpp"))
+
+    def test_changed_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.realpath(path)
+            self.create_repository(path)
+
+            # deleted files are left out, a renamed file is reported by its new name, untracked files are not changed
+            changed = util.get_changed_files_from_directory(path, "HEAD")
+            self.assertEqual(sorted(changed), sorted(os.path.join(path, name) for name in
+                             ["main.cpp", os.path.join("src", "changed.cpp"), os.path.join("src", "new name.cpp"), os.path.join("src", "added ü.cpp")]))
+
+            # from a subdirectory only its files are reported, its ignore files still apply
+            source_path = os.path.join(path, "src")
+            changed = util.get_changed_files_from_directory(source_path, "HEAD")
+            self.assertEqual(sorted(changed), sorted(os.path.join(source_path, name) for name in ["changed.cpp", "new name.cpp", "added ü.cpp"]))
+
+            output = run_script(["oc_cpp_issues.py", source_path, "--changed-since", "HEAD"])
+            self.assertEqual([line.split("|")[Column.FILE] for line in output.splitlines()], [os.path.join(source_path, "changed.cpp") + ":1"])
+
+
+def create_gcc_log(filename):
+    rules = ["-Wunused-variable", "-Wsign-compare", "-Wcast-align", "misc-const-correctness", "-Wformat-overflow=", "-Wcomment"]
+    lines = []
+    for index in range(300):
+        rule = rules[index * 7 % len(rules)]
+        file = ["src/a.cc", "inc/b.h", "src/c d.cc"][index % 3]
+        lines += [f"{file}:{index % 97 + 1}:{index % 9}: warning: 'x{index % 40}' has a | pipe, \"quotes\" & <b> [{rule}]"]
+    lines += ["x.cc:1:2: warning: 'quoted' [-Wmain]", "x.cc:3:4: warning: command line option ignored", "no warning"]
+    write_file(filename, "\n".join(lines + lines[:50]) + "\n")
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_run_matches_the_shell_pipe(self):
+        with tempfile.TemporaryDirectory() as path:
+            log = os.path.join(path, "gcc.log")
+            env = os.path.join(path, "env.txt")
+            create_gcc_log(log)
+            write_file(env, "CI_JOB_URL=https://ci/job/1/\nGITLAB_USER_NAME=user\nCI_PROJECT_URL=https://git/project\nCI_COMMIT_SHA=abc\n")
+            stages = ["parse_gcc.py gcc", "apply_team_priorities.py", "apply_low_hanging_fruit.py", "sortby.py", "create_report.py", f"apply_environment.py {env}"]
+            for count in [2, 4, len(stages)]:
+                with open(log, encoding="utf-8") as f:
+                    expected = f.read()
+                for stage in stages[:count]:
+                    expected = subprocess.run([sys.executable] + stage.split(" "), input=expected, check=True, stdout=subprocess.PIPE, text=True).stdout
+                with open(log, encoding="utf-8") as f:
+                    result = subprocess.run([sys.executable, "opencanary.py", "run", " | ".join(stages[:count])], stdin=f, check=True, stdout=subprocess.PIPE, text=True).stdout
+                self.assertEqual(expected, result)
+
+
+    def test_binary_format_gives_the_same_result(self):
+        with tempfile.TemporaryDirectory() as path:
+            log = os.path.join(path, "gcc.log")
+            create_gcc_log(log)
+            stages = [["parse_gcc.py", "gcc"], ["apply_team_priorities.py"], ["tr_customize_cs.py"], ["tr_interest_cs.py"],
+                      ["apply_low_hanging_fruit.py"], ["sortby.py"]]
+            results = []
+            for arguments in [[], ["--format=bin"]]:
+                with open(log, "rb") as f:
+                    data = f.read()
+                for stage in stages:
+                    data = subprocess.run([sys.executable] + stage + arguments, input=data, check=True, stdout=subprocess.PIPE).stdout
+                results += [data]
+            self.assertTrue(results[1].startswith(util.binary_header))
+            # the stages that read issues detect the format of their input
+            reports = [subprocess.run([sys.executable, "create_report.py"], input=data, check=True, stdout=subprocess.PIPE).stdout for data in results]
+            self.assertEqual(reports[0], reports[1])
+            self.assertEqual(subprocess.run([sys.executable, "sortby.py"], input=results[1], check=True, stdout=subprocess.PIPE).stdout, results[0])
+
+            with open(log, "rb") as f:
+                data = subprocess.run([sys.executable, "opencanary.py", "run", "--format=bin", "parse_gcc.py gcc | apply_team_priorities.py"],
+                                      stdin=f, check=True, stdout=subprocess.PIPE).stdout
+            self.assertTrue(data.startswith(util.binary_header))
+            for stage in stages[2:]:
+                data = subprocess.run([sys.executable] + stage, input=data, check=True, stdout=subprocess.PIPE).stdout
+            self.assertEqual(data, results[0])
+
+    def test_map_stages_stream(self):
+        line = "8|team|component|src/a.cc:1:2|gcc|array-bounds|warning|description|link\n"
+        process = subprocess.Popen([sys.executable, "apply_team_priorities.py"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        timer = threading.Timer(60, process.kill)
+        timer.start()
+        try:
+            # the first issue arrives while stdin is still open, after one chunk of lines
+            process.stdin.write(line * util.text_chunk_size)
+            process.stdin.flush()
+            self.assertEqual(process.stdout.readline(), line.replace("8|", "5|").replace("|warning|", "|ub|"))
+            process.stdin.close()
+            self.assertEqual(len(process.stdout.readlines()), util.text_chunk_size - 1)
+        finally:
+            timer.cancel()
+            process.wait()
+
+
+# the records written in the binary format by util.write_binary_fields()
+def write_binary_records(records):
+    stdout = sys.stdout
+    sys.stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    util.output_format = "bin"
+    try:
+        for parts in records:
+            util.write_binary_fields(parts)
+        util.flush_binary_output()
+        return sys.stdout.buffer.getvalue()
+    finally:
+        sys.stdout = stdout
+        util.output_format = "text"
+        util.binary_header_written = False
+
+
+class TestBinaryFormat(unittest.TestCase):
+
+    def test_round_trip(self):
+        records = [["4", "team", "component", f"src/file{index % 300}.h:{index}:3", "gcc", "-Wshadow", "warning",
+                    f"declaration of &#x27;x{index % 500}&#x27; shadows a member", "[3]"] for index in range(5000)]
+        records[7] = ["'40'", "", "é ü 漢", "C:/src/foo.h:127:23", "gcc", "b'unused'", "warning", "\"quoted\" description", "[3]{url}"]
+        records[4500:4500] = [["broken", "line"], ["7"], [""]]
+        records += [[f"value {index}"] for index in range(70000)]
+        data = write_binary_records(records)
+        self.assertTrue(data.startswith(util.binary_header))
+
+        # the same fields and issues as reading the lines of the text format
+        self.assertEqual(list(util.read_binary_fields(io.BytesIO(data))), records)
+        lines = ["|".join(parts) + "\n" for parts in records[:5003]]
+        issues = list(util.read_binary_issues(io.BytesIO(write_binary_records(records[:5003]))))
+        self.assertEqual(issues, [util.read_structured_line(line) for line in lines])
+        self.assertEqual(issues[7].rule, "unused")
+        self.assertIsInstance(issues[0], util.Issue)
+
+        # values that occur more than once are stored once per chunk
+        self.assertLess(len(data), sum(len("|".join(parts)) + 1 for parts in records[:5003]) + 70000 * 16)
+
+        with self.assertRaises(ValueError):
+            list(util.read_binary_fields(io.BytesIO(data[:-1])))
+
+
+class TestIssue(unittest.TestCase):
+
+    def test_issue_behaves_like_the_list_of_fields(self):
+        line = "40|team|component|C:/src/foo.h:127:23|gcc|'unused'|warning|\"quoted\" description|[3]{url}\n"
+        issue = util.read_structured_line(line)
+        self.assertEqual(issue, util.string_sql_escaping(line.strip().split("|")))
+        self.assertEqual(issue[Column.RULE], "unused")
+        self.assertEqual(issue.description, "quoted\" description")
+        self.assertEqual(util.join_report_line(issue), "40|team|component|C:/src/foo.h:127:23|gcc|unused|warning|quoted\" description|[3]{url}")
+
+        issue[Column.PRIO] = "7"
+        issue[Column.DESCRIPTION] = "[LOW] " + issue[Column.DESCRIPTION]
+        self.assertEqual(list(issue)[:2], ["7", "team"])
+        self.assertEqual(issue.description, "[LOW] quoted\" description")
+
+    def test_fields_are_interned_and_the_location_is_parsed(self):
+        first = util.read_structured_line("40|team|comp|src/a.cc:12:3|gcc|rule|warning|description|link")
+        second = util.read_structured_line("40|team|comp|C:/src/b.h:7|gcc|rule|warning|description|link")
+        self.assertIs(first.rule, second.rule)
+        self.assertIs(first.team, second.team)
+        # the warnings of a header are reported again for every file that includes it
+        again = util.read_structured_line("40|team|comp|src/a.cc:12:3|gcc|rule|warning|the description|link")
+        self.assertIs(again.file, util.read_structured_line("40|team|comp|src/a.cc:12:3|gcc|rule|warning|the description|link").file)
+        self.assertIs(again.description, util.read_issue_fields("40|team|comp|src/a.cc:12:3|gcc|rule|warning|the description|link".split("|")).description)
+        self.assertEqual((first.filename, first.line, first.column), ("src/a.cc", 12, 3))
+        self.assertEqual(second.get_location(), ("C:/src/b.h", 7, 0))
+        second[Column.FILE] = "other.h"
+        self.assertEqual(second.get_location(), ("other.h", 0, 0))
+
+    def test_broken_lines_stay_a_list(self):
+        self.assertEqual(util.read_structured_line("a|b\n"), ["a", "b"])
+
+
+class TestRuleTable(unittest.TestCase):
+
+    def test_first_matching_line_wins(self):
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, "priorities.txt")
+            write_file(filename, "# comment\n"
+                                 "priority exact    AP#3          35  # reinterpret_cast\n"
+                                 "priority contains overflow      80\n"
+                                 "priority exact    overflow=     5\n"
+                                 "category contains array-bounds  ub\n")
+            table = util.RuleTable(filename, ("priority", "category"))
+            self.assertEqual(table.lookup("AP#3"), ("35", None))
+            self.assertEqual(table.lookup("stringop-overflow="), ("80", None))
+            self.assertEqual(table.lookup("overflow="), ("80", None))
+            self.assertEqual(table.lookup("array-bounds"), (None, "ub"))
+            self.assertEqual(table.lookup("AP#3"), ("35", None))
+
+            write_file(filename, "priority like AP#3 35\n")
+            self.assertRaises(ValueError, util.RuleTable, filename, ("priority",))
+
+    def test_team_priorities(self):
+        import apply_team_priorities
+        self.assertEqual(apply_team_priorities.get_priority("self-assign"), 5)
+        self.assertEqual(apply_team_priorities.get_priority("self-assign-field"), 30)
+        self.assertEqual(apply_team_priorities.get_priority("no-such-rule"), util.Priority.UNASSIGNED.value)
+        issue = util.read_structured_line("8|team|component|a.cc:1|gcc|stringop-truncation|warning|description|link")
+        self.assertEqual(list(apply_team_priorities.transform(issue))[:7], ["10", "team", "component", "a.cc:1", "gcc", "stringop-truncation", "ub"])
+
+
+class TestIssueFilter(unittest.TestCase):
+
+    def test_tests_the_columns(self):
+        issue_filter = IssueFilter(['rule in {C4244, C4267}',
+                                    'component == "3rdparty" and not (rule == C4706 or file contains "_autogen")',
+                                    'description matches "(?i)^deprecated"'])
+        issue = "50|team|{}|{}|msvc|{}|warning|{}|[4]{{https://duckduckgo.com/?q=!ducky+msdn+C4244}}"
+        self.assertTrue(issue_filter.matches(issue.format("", "a.cpp:1", "C4267", "text").split("|")))
+        self.assertFalse(issue_filter.matches(issue.format("", "a.cpp:1", "C4245", "C4244 in the text").split("|")))
+        self.assertTrue(issue_filter.matches(issue.format("3rdparty", "a.cpp:1", "C4245", "text").split("|")))
+        self.assertFalse(issue_filter.matches(issue.format("3rdparty", "a.cpp:1", "C4706", "text").split("|")))
+        self.assertFalse(issue_filter.matches(issue.format("3rdparty", "x_autogen/a.cpp:1", "C4245", "text").split("|")))
+        self.assertTrue(issue_filter.matches(issue.format("", "a.cpp:1", "C4996", "Deprecated name").split("|")))
+        self.assertFalse(issue_filter.matches(["not an issue"]))
+
+        self.assertRaises(ValueError, IssueFilter, ['rules == C4244'])
+        self.assertRaises(ValueError, IssueFilter, ['rule in {C4244, C4267'])
+        self.assertRaises(ValueError, IssueFilter, ['rule == C4244 and'])
+
+    def test_regression_filter(self):
+        issues = "8|team|component|a.cc:1|gcc|sign-compare|warning|vla in the description|link\n" \
+                 "8|team|component|a.cc:2|gcc|vla|warning|description|link\n" \
+                 "8|team|component|a.cc:3|gcc|unused-variable|warning|sign-compare in the description|link\n" \
+                 "8|team|component|a.cc:4|clang|vla-extension|warning|description|link\n" \
+                 "8|team|component|a.cc:5|clang|vla-cxx-extension|warning|description|link\n"
+        result = subprocess.run([sys.executable, "tr_regression.py"], input=issues, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.stdout, "8|team|component|a.cc:3|gcc|unused-variable|warning|sign-compare in the description|link\n")
+
+
+class TestOwnershipMap(unittest.TestCase):
+
+    def test_first_matching_line_wins(self):
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, "owners.txt")
+            write_file(filename, "# comment\n"
+                                 "component src/core*    core  # also corelib\n"
+                                 "component 3rdparty/    thirdparty\n"
+                                 "component webkit       webkit\n"
+                                 "team      *.h          headers\n")
+            owners = util.OwnershipMap(filename, ("component", "team"))
+            self.assertEqual(owners.lookup("/home/src/corelib/a.cpp:10:2"), ("core", None))
+            self.assertEqual(owners.lookup(r"C:\src\3rdparty\webkit\a.cpp:1"), ("thirdparty", None))
+            self.assertEqual(owners.lookup("src/3rdparty/webkit/a.h:1"), ("thirdparty", "headers"))
+            self.assertEqual(owners.lookup("src/webkit/3rdparty/a.h:1"), ("thirdparty", "headers"))
+            self.assertEqual(owners.lookup("src/webkit/a.h:1"), ("webkit", "headers"))
+            self.assertEqual(owners.lookup("src/3rdparty"), (None, None))
+            self.assertEqual(owners.lookup("src/webkitx/a.cpp"), (None, None))
+
+            write_file(filename, "component src/core\n")
+            self.assertRaises(ValueError, util.OwnershipMap, filename, ("component",))
+
+    def test_customize_components(self):
+        import tr_customize_cs
+        import tr_customize_vc
+        parts = ["8", "team", "", "/build/src/3rdparty/webkit/a.h:1:1", "gcc", "rule", "warning", "description", "link"]
+        self.assertEqual(tr_customize_cs.define_component(parts), "webkit")
+        parts[Column.FILE] = "/project/lib/shmemlib/kernel.cc:5"
+        self.assertEqual(tr_customize_vc.define_component(parts), "IPC")
+        self.assertEqual(tr_customize_vc.define_team(parts), "platform")
+        parts[Column.FILE] = "/project/app/kernel.cc:5"
+        self.assertEqual(tr_customize_vc.define_team(parts), "project")
+
+
+class TestCodeOwners(unittest.TestCase):
+
+    def test_last_matching_line_wins(self):
+        import apply_codeowners
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, ".github", "CODEOWNERS")
+            os.makedirs(os.path.dirname(filename))
+            write_file(filename, "# comment\n"
+                                 "*               @global-owner\n"
+                                 "*.js            @js-owner  # inline comment\n"
+                                 "docs/*          @docs\n"
+                                 "/build/logs/    @doctocat\n"
+                                 "**/logs         @octocat\n"
+                                 "/apps/          @octocat\n"
+                                 "/apps/github\n")
+            codeowners = apply_codeowners.CodeOwners(filename, apply_codeowners.get_default_root(filename))
+            self.assertEqual(codeowners.lookup("README.md"), "@global-owner")
+            self.assertEqual(codeowners.lookup("src/a.js:10:2"), "@js-owner")
+            self.assertEqual(codeowners.lookup("docs/index.md"), "@docs")
+            self.assertEqual(codeowners.lookup("docs/build-app/troubleshooting.md"), "@global-owner")
+            self.assertEqual(codeowners.lookup("build/logs/sub/a.log"), "@octocat")
+            self.assertEqual(codeowners.lookup(os.path.join(path, "apps", "a.c") + ":1"), "@octocat")
+            self.assertEqual(codeowners.lookup("apps/github/a.c:1"), None)
+            self.assertEqual(codeowners.lookup("/elsewhere/a.c:1"), None)
+
+            issues = "8|[[team]]|component|apps/a.c:1|gcc|rule|warning|description|link\n" \
+                     "8|[[team]]|component|apps/github/a.c:1|gcc|rule|warning|description|link\n"
+            expected = "8|@octocat|component|apps/a.c:1|gcc|rule|warning|description|link\n" \
+                       "8|[[team]]|component|apps/github/a.c:1|gcc|rule|warning|description|link\n"
+            for args in [["apply_codeowners.py", filename], ["opencanary.py", "run", "apply_codeowners.py " + filename]]:
+                result = subprocess.run([sys.executable] + args, input=issues, check=True, capture_output=True, text=True)
+                self.assertEqual(result.stdout, expected)
+
+
+class TestParseMsvc(unittest.TestCase):
+
+    def test_filenames_are_resolved_once(self):
+        with tempfile.TemporaryDirectory() as path:
+            header = os.path.join(path, "Central.h")
+            write_file(header, "")
+            missing = os.path.join(path, "missing.h")
+            log = "".join(f"{name}({i}): warning C4251: 'x': description\n" for i in range(10) for name in [header, missing])
+            result = subprocess.run([sys.executable, "parse_msvc.py", "msvc"], input=log, check=True, capture_output=True,
+                                    text=True, env=dict(os.environ, CI_SERVER="1"))
+            self.assertEqual(len(result.stdout.splitlines()), 20)
+            self.assertEqual(result.stderr.count("Could not resolve:"), 1)
+            self.assertIn("Resolved 20 filename(s), 18 from the cache (90.0%), 2 on the filesystem", result.stderr)
+
+
+class TestInventory(unittest.TestCase):
+
+    def test_tools_give_the_same_result_with_an_inventory(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            index = os.path.join(path, "inventory.json")
+            walked = run_script(["oc_cpp_issues.py", path])
+            self.assertEqual(walked, run_script(["oc_cpp_issues.py", path], env={"OPENCANARY_INVENTORY": index}))
+            self.assertTrue(os.path.isfile(index))
+            self.assertEqual(walked, run_script(["oc_cpp_issues.py", path], env={"OPENCANARY_INVENTORY": index}))
+
+            headers = run_script(["inventory.py", "--index", index, "list", path, "--kind", "header"]).splitlines()
+            self.assertEqual(len(headers), 12)
+
+    def test_incremental_refresh(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            index = os.path.join(path, "inventory.json")
+            walked = util.get_files_from_directory(path, index_filename="")
+            self.assertEqual(util.get_files_from_directory(path, index_filename=index), walked)
+
+            write_file(os.path.join(path, "src", "new.cpp"), "")
+            write_file(os.path.join(path, "inc", "header1.h"), "changed\n")
+            write_file(os.path.join(path, "inc", ".opencanaryignore"), "header2.h\n")
+            os.remove(os.path.join(path, "src", "source3.cpp"))
+            walked = util.get_files_from_directory(path, index_filename="")
+            self.assertEqual(util.get_files_from_directory(path, index_filename=index), walked)
+            self.assertNotIn(os.path.join(path, "inc", "header2.h"), walked)
+
+            saved = inventory.Inventory(index, path)
+            record = saved.files[os.path.join("inc", "header1.h")]
+            self.assertEqual((record["kind"], record["size"]), ("header", len("changed\n")))
+            self.assertEqual(record["sha1"], inventory.get_file_hash(os.path.join(path, "inc", "header1.h")))
+            self.assertNotIn(os.path.join("ignored", "ignored.cpp"), saved.files)
+
+    def test_ignored_directories_are_not_scanned(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_sample_tree(path)
+            write_file(os.path.join(path, ".gitignore"), "inc/\n")
+            index = os.path.join(path, "inventory.json")
+            util.get_files_from_directory(path, index_filename=index)
+            saved = inventory.Inventory(index, path)
+            self.assertNotIn("ignored", saved.directories)
+            self.assertNotIn(os.path.join("ignored", "ignored.cpp"), saved.files)
+
+            for ignore_files in [[".gitignore"], [".opencanaryignore"]]:
+                walked = util.get_files_from_directory(path, ignore_files, index_filename="")
+                self.assertEqual(util.get_files_from_directory(path, ignore_files, index_filename=index), walked)
+            saved = inventory.Inventory(index, path)
+            self.assertEqual(saved.files[os.path.join("inc", "header1.h")]["ignored"], {".opencanaryignore": False, ".gitignore": True})
+            self.assertEqual(saved.files[os.path.join("ignored", "ignored.cpp")]["ignored"], {".opencanaryignore": True, ".gitignore": False})
+
+
 if __name__ == '__main__':
     unittest.main()
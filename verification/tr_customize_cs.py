@@ -13,45 +13,23 @@ from util import eprint
 msvc = False
 
 
+# the component per path, see owners_cs.txt
+owners = None
+
+
+def get_owners():
+    global owners
+    if owners is None:
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "owners_cs.txt")
+        owners = util.OwnershipMap(filename, ("component",))
+    return owners
+
+
 def define_component(parts):
-    file = parts[Column.FILE].replace("\\", r"/")
-    if "include/QtMultimedia" in file:
-        return "CsMultimedia"
-    if "include/QtCore" in file:
-        return "CsCore"
-    if "/src/core" in file:
-        return "CsCore"
-    if "include/QtGui" in file:
-        return "CsGui"
-    if "/webkit" in file:
-        return "webkit"
-    if "/WebCore" in file:
-        return "WebCore"
-    if "/src/gui/" in file:
-        return "CsGui"
-    if "/src/multimedia/" in file:
-        return "multimedia"
-    if "/src/network/" in file:
-        return "network"
-    if "/src/opengl/" in file:
-        return "opengl"
-    if "/src/plugins/" in file:
-        return "plugins"
-    if "/src/script/" in file:
-        return "script"
-    if "/src/svg/" in file:
-        return "svg"
-    if "/src/xmlpatterns/" in file:
-        return "xmlpatterns"
-    if "/src/xml/" in file:
-        return "xml"
-    if "/src/tools/" in file:
-        return "tools"
-    if "/3rdparty" in file:
-        return "3rdparty"
-    if "/MSVC" in file:
-        return "MSVC"
-    return ""
+    component = get_owners().lookup(parts[Column.FILE])[0]
+    if component is None:
+        return ""
+    return component
 
 
 def get_substring_end_position(needle, haystack):
@@ -119,9 +97,8 @@ def create_default_link(parts):
     return links
 
 
-def customize(line):
+def customize(parts):
     global msvc
-    parts = line.strip().split("|")
     parts[Column.COMPONENT] = define_component(parts)
     if msvc:
         parts[Column.FILE] = remove_build_path(parts).replace("/", "\\")
@@ -139,16 +116,18 @@ def customize(line):
 def show_usage():
     eprint("Usage: " + os.path.basename(__file__) + " [/msvc]")
     eprint("   /msvc transform unix paths generated by lexers/parsers also to windows style paths")
+    eprint("   --format=bin writes the issues in the binary format instead of text")
     eprint("   will customize structured CSV, according to user-specific rulesm, see customize()")
 
 
 def main():
     global msvc
+    util.apply_format_argument()
     if len(sys.argv) > 1:
         msvc = True
 
-    for line in sys.stdin:
-        customize(line)
+    for parts in util.read_written_fields():
+        customize(parts)
 
 
 if __name__ == "__main__":
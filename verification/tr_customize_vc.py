@@ -19,42 +19,30 @@ windows_separator = "\\"
 unix_separator = "/"
 
 
+# the component and team per path, see owners_vc.txt
+owners = None
+
+
+def get_owners():
+    global owners
+    if owners is None:
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "owners_vc.txt")
+        owners = util.OwnershipMap(filename, ("component", "team"))
+    return owners
+
+
 def define_component(parts):
-    file = parts[Column.FILE].replace("\\", r"/")
-    if "lib/toolkit" in file:
-        return "toolkit"
-    if "/sensing" in file:
-        return "sensing"
-    if "/tooling/" in file:
-        return "tooling"
-    if "/keylok" in file:
-        return "device"
-    if "/vqt" in file:
-        return "UI"
-    if "/taskcommunication" in file:
-        return "IPC"
-    if "/viceventlog" in file:
-        return "logging"
-    if "/logviewer" in file:
-        return "logviewer"
-    if "/lib/shmemlib" in file:
-        return "IPC"
-    return ""
+    component = get_owners().lookup(parts[Column.FILE])[0]
+    if component is None:
+        return ""
+    return component
 
 
 def define_team(parts):
-    file = parts[Column.FILE].replace("\\", r"/")
-    if "/lib/" in file:
-        return "platform"
-    if "/infrastructure/" in file:
+    team = get_owners().lookup(parts[Column.FILE])[1]
+    if team is None:
         return "platform"
-    if "/window.cc" in file:
-        return "project"
-    if "/kernel" in file:
-        return "project"
-    if "/modules/" in file:
-        return "project"
-    return "platform"
+    return team
 
 
 def get_substring_end_position(needle, haystack):
@@ -156,8 +144,7 @@ def replace_links(new_links, existing_links):
     return dict_to_links(result)
 
 
-def customize(line):
-    parts = line.strip().split("|")
+def customize(parts):
     parts[Column.COMPONENT] = define_component(parts)
     parts[Column.TEAM] = define_team(parts)
     parts[Column.FILE], needs_link = get_sanitized_build_path(parts)
@@ -177,6 +164,7 @@ def show_usage():
     eprint("   /display_depth=n         set display_depth to n, used to show a path in the report that looks nice to the user")
     eprint("   /reference_depth=n       set reference_depth to n, used to align the path with [[permalink-prefix]] to form a working URL")
     eprint("   note: any option may also be given as -option instead of /option, this is useful in environments where / is ambiguous")
+    eprint("   --format=bin writes the issues in the binary format instead of text")
     eprint("   will customize structured CSV, according to user-specific rules, see customize()")
 
 
@@ -210,11 +198,12 @@ def apply_settings(arg):
 
 
 def main():
+    util.apply_format_argument()
     for arg in sys.argv[1:]:
         apply_settings(arg[1:].lower())
 
-    for line in sys.stdin:
-        customize(line)
+    for parts in util.read_written_fields():
+        customize(parts)
 
 
 if __name__ == "__main__":
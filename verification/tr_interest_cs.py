@@ -5,89 +5,63 @@
 import traceback
 import sys
 import os
+import util
 from util import eprint
+from issue_filter import IssueFilter
 
 
-# note: return True if the line should be kept
-def is_interesting(line):
-    if "C4101" in line:  # unreferenced local variable
-        return False
-    if "|3rdparty|" in line:
-        if "C4706" in line:  # assignment within conditional expression (checked)
-            return False
-        if "C4245" in line:  # 'return': conversion from 'int' to 'unsigned int', signed/unsigned mismatch
-            return False
-        if "4459" in line:  # [3rdparty]: declaration of 'table_tags' hides global declaration
-            return False
-    if "|webkit|" in line:
-        if "C4706" in line:  # assignment within conditional expression (checked)
-            return False
-        if "C4389" in line:  # '==': signed/unsigned mismatch
-            return False
-    if "|WebCore|" in line:
-        if "C4702" in line:  # unreachable code
-            return False
-        if "C4065" in line:  # switch statement contains 'default' but no 'case' labels
-            return False
-    if "harfbuzz" in line:
-        if "C4702" in line:  # unreachable code
-            return False
-    if "C4242" in line:     # [WebCore]: '=': conversion from 'int' to 'yytype_int16', possible loss of data
-        return False        # in WebCore, CsCore, CsGui and 3rdparty
-    if "C4244" in line:     # 'argument': conversion from 'qint64' to 'double', possible loss of data
-        return False
-    if "C4291" in line:     # no matching operator delete
-        return False
-    if "C4267" in line:     # [CsCore]: 'initializing': conversion from 'size_t' to 'int', possible loss of data
-        return False
-    if "C4706" in line:     # assignment within conditional expression
-        return False
-    if "dll-interface" in line:
-        return False
-    if "via dominance" in line:
-        return False
-    if "marked as __forceinline not inlined" in line:
-        return False
-    if "The POSIX name for this item is deprecated" in line:
-        return False
-    if "_CRT_SECURE_NO_WARNINGS" in line:
-        return False
-    if "C4100" in line:  # 'size': unreferenced formal parameter
-        return False
-    if "C4456" in line:  # [CsCore]: declaration of 'oldNext' hides previous local declaration
-        return False
-    if "C4458" in line:  # [CsGui]: declaration of 'state' hides class member
-        return False
-    if "C4457" in line:  # declaration of 'value' hides function parameter
-        return False
-    if "C4996" in line:  # non-deprecation warning in iterator (was actually never standard)
-        if "|MSVC|" in line:
-            return False
-    if "C4389" in line:    # [CsCore]: '!=': signed/unsigned mismatc
-        return False
-    if "C4389" in line:
-        return False
-    if "attribute [[gnu::used]] is not recognized" in line:
-        return False
-    if "|CsCore|" in line:  # signed/unsigned mismatch, \network\qt\QNetworkReplyHandler.cpp:122 used on positive sizes
-        if "C4018" in line:
-            return False
-    return True
-
-
-def apply_filter(line):
-    if is_interesting(line):
-        sys.stdout.write(line)
-
-
-def apply_filter_and_normalize_msvc(line):
-    if is_interesting(line):
-        sys.stdout.write(line.replace('\\', '/'))
+# the issues that are not interesting, see issue_filter.py for the syntax
+uninteresting = [
+    'rule == C4101',                                # unreferenced local variable
+    # [3rdparty] assignment within conditional expression (checked), 'return': conversion from 'int' to 'unsigned int',
+    # signed/unsigned mismatch and declaration of 'table_tags' hides global declaration
+    'component == "3rdparty" and rule in {C4706, C4245, C4459}',
+    'component == webkit and rule in {C4706, C4389}',   # assignment within conditional expression (checked), '==': signed/unsigned mismatch
+    'component == WebCore and rule in {C4702, C4065}',  # unreachable code, switch statement contains 'default' but no 'case' labels
+    'file contains harfbuzz and rule == C4702',     # unreachable code
+    'rule == C4242',        # [WebCore]: '=': conversion from 'int' to 'yytype_int16', possible loss of data, in WebCore, CsCore, CsGui and 3rdparty
+    'rule == C4244',        # 'argument': conversion from 'qint64' to 'double', possible loss of data
+    'rule == C4291',        # no matching operator delete
+    'rule == C4267',        # [CsCore]: 'initializing': conversion from 'size_t' to 'int', possible loss of data
+    'rule == C4706',        # assignment within conditional expression
+    'description contains {'
+    '   dll-interface,'
+    '   "via dominance",'
+    '   "marked as __forceinline not inlined",'
+    '   "The POSIX name for this item is deprecated",'
+    '   _CRT_SECURE_NO_WARNINGS,'
+    '   "attribute [[gnu::used]] is not recognized"}',
+    'rule == C4100',        # 'size': unreferenced formal parameter
+    'rule == C4456',        # [CsCore]: declaration of 'oldNext' hides previous local declaration
+    'rule == C4458',        # [CsGui]: declaration of 'state' hides class member
+    'rule == C4457',        # declaration of 'value' hides function parameter
+    'rule == C4996 and component == MSVC',      # non-deprecation warning in iterator (was actually never standard)
+    'rule == C4389',        # [CsCore]: '!=': signed/unsigned mismatch
+    'rule == C4018 and component == CsCore',    # signed/unsigned mismatch, \network\qt\QNetworkReplyHandler.cpp:122 used on positive sizes
+]
+
+issue_filter = IssueFilter(uninteresting)
+
+
+# note: return True if the issue should be kept
+def is_interesting(parts):
+    return not issue_filter.matches(parts)
+
+
+def apply_filter(parts):
+    if is_interesting(parts):
+        util.write_written_fields(parts)
+
+
+def apply_filter_and_normalize_msvc(parts):
+    parts = [part.replace('\\', '/') for part in parts]
+    if is_interesting(parts):
+        util.write_written_fields(parts)
 
 
 def show_usage():
-    eprint("Usage: " + os.path.basename(__file__) + " [/msvc]")
-    eprint("   will filter all lines from 3rd party as hardcoded by you in this script")
+    eprint("Usage: " + os.path.basename(__file__) + " [/msvc] [--format=bin]")
+    eprint("   will filter all issues from 3rd party as hardcoded by you in the 'uninteresting' list in this script")
     eprint(r"   /msvc   - ignore messages from MSVC system headers and normalize paths, replacing \ with /")
 
 
@@ -99,12 +73,13 @@ def has_argument(value):
 
 
 def main():
+    util.apply_format_argument()
     if has_argument("msvc"):
-        for line in sys.stdin:
-            apply_filter_and_normalize_msvc(line)
+        for parts in util.read_written_fields():
+            apply_filter_and_normalize_msvc(parts)
     else:
-        for line in sys.stdin:
-            apply_filter(line)
+        for parts in util.read_written_fields():
+            apply_filter(parts)
     sys.exit(0)
 
 
@@ -5,43 +5,52 @@
 import traceback
 import sys
 import os
+import util
 from util import *
+from issue_filter import IssueFilter
 
 
-# note: return True if the line should be kept
-def is_interesting(line):
-    if "_autogen" in line:
-        return False
-    if "|use of old-style|" in line:
-        return False
-    return True
+# the issues that are not interesting, see issue_filter.py for the syntax
+uninteresting = [
+    'file contains _autogen',
+    'category == "use of old-style"',
+]
 
+issue_filter = IssueFilter(uninteresting)
 
-def apply_filter(line):
-    if is_interesting(line):
-        sys.stdout.write(line)
 
+# note: return True if the issue should be kept
+def is_interesting(parts):
+    return not issue_filter.matches(parts)
 
-def apply_filter_and_normalize_msvc(line):
-    if is_interesting(line):
-        sys.stdout.write(line.replace('\\', '/'))
+
+def apply_filter(parts):
+    if is_interesting(parts):
+        util.write_written_fields(parts)
+
+
+def apply_filter_and_normalize_msvc(parts):
+    parts = [part.replace('\\', '/') for part in parts]
+    if is_interesting(parts):
+        util.write_written_fields(parts)
 
 
 def show_usage():
-    eprint("Usage: " + os.path.basename(__file__) + " [/msvc]")
-    eprint("   will filter all lines from 3rd party as hardcoded by you in this script")
+    eprint("Usage: " + os.path.basename(__file__) + " [/msvc] [--format=bin]")
+    eprint("   will filter all issues from 3rd party as hardcoded by you in the 'uninteresting' list in this script")
     eprint(r"   /msvc  - also ignore messages from MSVC system headers and normalize paths, replacing \ with /")
 
 
 def main():
+    util.apply_format_argument()
     if len(sys.argv) < 2:
-        for line in sys.stdin:
-            apply_filter(line)
+        for parts in util.read_written_fields():
+            apply_filter(parts)
         sys.exit(0)
 
     if len(sys.argv) == 2 and sys.argv[1] == "/msvc":
-        for line in sys.stdin:
-            apply_filter_and_normalize_msvc(line)
+        for parts in util.read_written_fields():
+            apply_filter_and_normalize_msvc(parts)
         sys.exit(0)
 
     eprint("error: invalid argument(s)\n")
@@ -7,6 +7,8 @@ any issues that pass this filter fail the build
 import traceback
 import sys
 import os
+import util
+from issue_filter import IssueFilter
 
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
@@ -16,44 +18,33 @@ def sprint(*args, **kwargs):
     print(*args, file=sys.stdout, **kwargs)
 
 
+# all issues that currently exist, see issue_filter.py for the syntax
+# they are filtered out, so we know when to fail the build (when new issues are introduced)
+existing = [
+    'rule contains {format-extra-args, "format=", ignored-qualifiers, missing-field-initializers, overflow, sign-compare}',
+    'rule contains {unused-but-set-variable, unused-function, unused-parameter, write-strings}',
+    'rule contains vla',    # vla, vla-extension, vla-cxx-extension
+    'rule == rule-missing',
+]
+
+
 def filter_stdin():
+    issue_filter = IssueFilter(existing)
     results = []
-    for line in sys.stdin:
-        # filter out all issues that currently exist, so we know when to fail the build (when new issues are introduced)
-        if "format-extra-args" in line:
-            continue
-        if "format=" in line:
-            continue
-        if "ignored-qualifiers" in line:
-            continue
-        if "missing-field-initializers" in line:
-            continue
-        if "overflow" in line:
-            continue
-        if "rule-missing" in line:
-            continue
-        if "sign-compare" in line:
-            continue
-        if "unused-but-set-variable" in line:
-            continue
-        if "unused-function" in line:
-            continue
-        if "unused-parameter" in line:
-            continue
-        if "vla" in line:
-            continue
-        if "write-strings" in line:
+    for parts in util.read_written_fields():
+        if issue_filter.matches(parts):
             continue
-        results += [line]
+        results += [parts]
     return results
 
 
 def show_usage():
-    eprint("Usage: <input> | " + os.path.basename(__file__))
+    eprint("Usage: <input> | " + os.path.basename(__file__) + " [--format=bin]")
     eprint("   When the 'regression' transformation yields any results new issues have be introduced and the build should fail!")
 
 
 def main():
+    util.apply_format_argument()
     if len(sys.argv) != 1:
         eprint("error: invalid argument(s)\n")
         show_usage()
@@ -63,8 +54,8 @@ def main():
 
     if len(regression_issues) > 0:
         eprint(len(regression_issues), "new issue(s) where introduced!\n")
-        for line in regression_issues:
-            sprint(line.strip())
+        for parts in regression_issues:
+            util.write_written_fields(parts)
         sys.exit(1)
     sys.exit(0)
 
@@ -4,6 +4,13 @@ import sys
 import os
 import re
 import html
+import array
+import fnmatch
+import atexit
+import struct
+import operator
+import itertools
+import subprocess
 import gitignore_parser
 from enum import IntEnum
 from datetime import datetime
@@ -11,6 +18,28 @@ from datetime import datetime
 # global variable used to query env.txt that is read at main()
 envfile = {}
 
+# the text lines written by write_text_line() that are not written to stdout yet
+text_chunk_size = 1024
+text_chunk = []
+
+# format of the issues written to stdout, "text" (pipe-separated lines) or "bin", see apply_format_argument()
+output_format = "text"
+
+# the binary format: this header, followed by chunks of up to binary_chunk_size records with the same number of fields.
+# A chunk starts with its number of records and fields (binary_chunk), followed by every column of the chunk:
+# - its number of distinct values and the size of their utf-8 data (binary_column)
+# - the length of every distinct value in characters (uint32)
+# - the distinct values, utf-8 encoded as one block
+# - per record the index of its value in the distinct values, uint8, uint16 or uint32 depending on their number,
+#   left out when every value is distinct, the values are in record order then
+# All numbers are little-endian. The header starts with a null character, so it is never mistaken for text.
+binary_header = b"\0opencanary-bin-1\n"
+binary_chunk = struct.Struct("<II")
+binary_column = struct.Struct("<II")
+binary_chunk_size = 4096
+binary_chunk_records = []
+binary_header_written = False
+
 
 class Priority(IntEnum):
     LOW_HANGING = 7
@@ -30,6 +59,237 @@ class Column(IntEnum):
     LINK = 8
 
 
+# the attribute names of the Issue fields, in Column order
+issue_fields = ("prio", "team", "component", "file", "source", "rule", "category", "description", "link")
+
+# the fields of an Issue as a tuple in Column order
+get_issue_values = operator.attrgetter(*issue_fields)
+
+# fields with few distinct values, the issues share one string per value
+interned_fields = {"prio", "team", "component", "source", "rule", "category"}
+
+# fields that repeat with the warnings of a header, reported again for every file that includes it,
+# the issues share them as well, but they are not few enough to remember per value (see issue_filter.py)
+repeated_fields = {"file", "description"}
+
+
+# the fileref "filename[:line[:column]]" as (filename, line, column), 0 when the line or column is missing
+def split_fileref(fileref):
+    parts = fileref.split(":")
+    numbers = []
+    while len(parts) > 1 and len(numbers) < 2 and parts[-1].isdigit():
+        numbers.insert(0, int(parts.pop()))
+    numbers += [0] * (2 - len(numbers))
+    return (":".join(parts), numbers[0], numbers[1])
+
+
+class Issue:
+    """
+    One issue, the compact form of the nine fields of a structured line.
+    The fields are accessed by Column (issue[Column.RULE]) or by name (issue.rule), iterating yields them in Column order.
+    The low-cardinality and repeated fields are interned, the fileref is only split into filename, line and column when
+    they are used.
+    """
+    __slots__ = issue_fields[:3] + ("_file", "_location") + issue_fields[4:]
+
+    def __init__(self, prio, team, component, file, source, rule, category, description, link):
+        self.prio = sys.intern(prio)
+        self.team = sys.intern(team)
+        self.component = sys.intern(component)
+        self.file = file
+        self.source = sys.intern(source)
+        self.rule = sys.intern(rule)
+        self.category = sys.intern(category)
+        self.description = sys.intern(description)
+        self.link = link
+
+    @property
+    def file(self):
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = sys.intern(value)
+        self._location = None
+
+    # the fileref as (filename, line, column), see split_fileref()
+    def get_location(self):
+        if self._location is None:
+            self._location = split_fileref(self._file)
+        return self._location
+
+    @property
+    def filename(self):
+        return self.get_location()[0]
+
+    @property
+    def line(self):
+        return self.get_location()[1]
+
+    @property
+    def column(self):
+        return self.get_location()[2]
+
+    def __getitem__(self, column):
+        return getattr(self, issue_fields[column])
+
+    def __setitem__(self, column, value):
+        name = issue_fields[column]
+        if name in interned_fields or name in repeated_fields:
+            value = sys.intern(value)
+        setattr(self, name, value)
+
+    def __iter__(self):
+        return iter(get_issue_values(self))
+
+    def __len__(self):
+        return len(issue_fields)
+
+    def __eq__(self, other):
+        if isinstance(other, (Issue, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Issue{tuple(self)!r}"
+
+
+class RuleTable:
+    """
+    Ordered '<field> <match> <rule> <value>' lines from a data file (see team_priorities.txt), the first line of
+    a field that matches the rule of an issue gives the value of that field.
+    The lines are compiled into a dict of the 'exact' lines and a list of the 'contains' lines, and the values
+    are remembered per distinct rule, so a rule seen before costs one dict lookup.
+    """
+
+    def __init__(self, filename, fields):
+        self.fields = fields
+        self.exact = {}         # rule: [(position, value)] per field
+        self.contains = []      # [(position, text, value)] per field
+        self.memo = {}
+        for field in fields:
+            self.exact[field] = {}
+            self.contains.append([])
+        with open(filename, encoding="utf-8") as f:
+            for position, line in enumerate(f, 1):
+                line = re.split(r"\s#", line, maxsplit=1)[0].strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                parts = line.split()
+                if len(parts) != 4 or parts[0] not in fields or parts[1] not in ["exact", "contains"]:
+                    raise ValueError(f"{filename}:{position}: expected '<field> <exact|contains> <rule> <value>', got: {line}")
+                field, match, text, value = parts
+                if match == "exact":
+                    self.exact[field].setdefault(text, (position, value))
+                else:
+                    self.contains[fields.index(field)].append((position, text, value))
+
+    # returns a tuple with the value per field for the rule, None for a field without a matching line
+    def lookup(self, rule):
+        result = self.memo.get(rule)
+        if result is None:
+            result = tuple(self.find(rule, field, contains) for field, contains in zip(self.fields, self.contains))
+            self.memo[rule] = result
+        return result
+
+    def find(self, rule, field, contains):
+        position, value = self.exact[field].get(rule, (None, None))
+        for contains_position, text, contains_value in contains:
+            if position is not None and contains_position > position:
+                break
+            if text in rule:
+                return contains_value
+        return value
+
+
+class PathTrieNode:
+    """
+    One path segment of the patterns of an OwnershipMap, with the lines whose pattern ends here.
+    """
+    __slots__ = ("children", "globs", "glob_memo", "values")
+
+    def __init__(self):
+        self.children = {}      # segment: PathTrieNode
+        self.globs = []         # [(segment with wildcards, PathTrieNode)]
+        self.glob_memo = {}     # segment: [PathTrieNode] of the matching globs
+        self.values = []        # [(position, field index, value, directory only)]
+
+    def add(self, segment):
+        if any(c in segment for c in "*?["):
+            for glob, node in self.globs:
+                if glob == segment:
+                    return node
+            node = PathTrieNode()
+            self.globs.append((segment, node))
+            return node
+        return self.children.setdefault(segment, PathTrieNode())
+
+    def get_children(self, segment):
+        nodes = self.glob_memo.get(segment)
+        if nodes is None:
+            nodes = [node for glob, node in self.globs if fnmatch.fnmatchcase(segment, glob)]
+            self.glob_memo[segment] = nodes
+        child = self.children.get(segment)
+        if child is not None:
+            return [child] + nodes
+        return nodes
+
+
+class OwnershipMap:
+    """
+    Ordered '<field> <pattern> <value>' lines from a data file (see owners_vc.txt), like a CODEOWNERS file,
+    the first line of a field whose pattern matches the path of an issue gives the value of that field.
+    A pattern is a sequence of path segments that matches consecutive segments anywhere in the path, a segment
+    can contain the wildcards * ? and [...], a pattern that ends with '/' only matches directories.
+    The patterns are compiled into a trie of path segments, so matching a path costs time depending on its
+    depth instead of the number of lines, and the values are remembered per normalised filename.
+    """
+
+    def __init__(self, filename, fields):
+        self.fields = fields
+        self.root = PathTrieNode()
+        self.memo = {}
+        with open(filename, encoding="utf-8") as f:
+            for position, line in enumerate(f, 1):
+                line = re.split(r"\s#", line, maxsplit=1)[0].strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                parts = line.split()
+                segments = parts[1].strip("/").split("/") if len(parts) == 3 else []
+                if len(parts) != 3 or parts[0] not in fields or "" in segments:
+                    raise ValueError(f"{filename}:{position}: expected '<field> <pattern> <value>', got: {line}")
+                field, pattern, value = parts
+                node = self.root
+                for segment in segments:
+                    node = node.add(segment)
+                node.values.append((position, fields.index(field), value, pattern.endswith("/")))
+
+    # returns a tuple with the value per field for the file (a fileref or filename, \ or / separated),
+    # None for a field without a matching line
+    def lookup(self, file):
+        path = split_fileref(file)[0].replace("\\", "/")
+        result = self.memo.get(path)
+        if result is None:
+            result = self.find([segment for segment in path.split("/") if segment not in ["", "."]])
+            self.memo[path] = result
+        return result
+
+    def find(self, segments):
+        found = [(0, None)] * len(self.fields)
+        for start in range(len(segments)):
+            nodes = [self.root]
+            for index in range(start, len(segments)):
+                nodes = [child for node in nodes for child in node.get_children(segments[index])]
+                if not nodes:
+                    break
+                is_directory = index < len(segments) - 1
+                for node in nodes:
+                    for position, field, value, directory_only in node.values:
+                        if (is_directory or not directory_only) and (found[field][1] is None or position < found[field][0]):
+                            found[field] = (position, value)
+        return tuple(value for _position, value in found)
+
+
 def on_ci_server():
     return "CI_SERVER" in os.environ
 
@@ -62,12 +322,19 @@ def join_report_line(parts):
     return s.join(replace_pipe(parts))
 
 
+def create_issue(priority, team, component, filename, source, rule, category, description, link):
+    return Issue(str(priority), team, component, filename, source, rule, category, html.escape(description), link)
+
+
 def report(priority, team, component, filename, source, rule, category, description, link):
-    sprint(join_report_line([str(priority), team, component, filename, source, rule, category, html.escape(description), link]))
+    sprint(join_report_line(create_issue(priority, team, component, filename, source, rule, category, description, link)))
 
 
 def report_list(list_value):
-    sprint(join_report_line(list_value))
+    if output_format == "bin":
+        write_binary_fields(get_issue_values(list_value) if isinstance(list_value, Issue) else list_value)
+        return
+    write_text_line(join_report_line(list_value))
 
 
 def string_sql_escaping_word(word):
@@ -87,11 +354,31 @@ def string_sql_escaping(line):
 
 
 def read_structured_line(line):
-    result = string_sql_escaping(line.strip().split("|"))
-    check_structured_line_parts(result)
+    parts = line.strip().split("|")
+    if len(parts) == len(Column) and "'" not in line and '"' not in line:
+        return Issue(*parts)  # nothing to unquote, see string_sql_escaping()
+    return read_issue_fields(parts)
+
+
+# the fields of an issue as a next stage finds them in the line written by report_list(), without joining them
+def write_issue_fields(parts):
+    result = replace_pipe(parts)
+    if result:
+        result[0] = result[0].lstrip()
+        result[-1] = result[-1].rstrip()
     return result
 
 
+# the issue read_structured_line() returns for a line with these fields, without splitting the line
+# a broken line is returned as the list of its parts
+def read_issue_fields(parts):
+    if len(parts) != len(Column):
+        result = string_sql_escaping(parts)
+        check_structured_line_parts(result)
+        return result
+    return Issue(*map(string_sql_escaping_word, parts))
+
+
 def check_structured_line_parts(parts):
     if len(parts) != len(Column):
         eprint(f"assertion failed: broken structured CSV, line has {len(parts)}/{len(Column)} parts:\n {parts}")
@@ -99,8 +386,216 @@ def check_structured_line_parts(parts):
 
 def write_structured_line(parts):
     check_structured_line_parts(parts)
-    sys.stdout.write("|".join(parts))
-    sys.stdout.write("\n")
+    write_written_fields(parts)
+
+
+# removes --format=text or --format=bin from sys.argv and sets the output_format, call it before checking sys.argv
+def apply_format_argument():
+    global output_format
+    for arg in sys.argv[1:]:
+        if arg.startswith("--format="):
+            value = arg.split("=", 1)[1]
+            if value not in ["text", "bin"]:
+                eprint(f"commandline error: unknown format '{value}', use --format=text or --format=bin")
+                sys.exit(1)
+            output_format = value
+            sys.argv.remove(arg)
+
+
+# writes a line (without the newline) to stdout, like sprint() but the lines are encoded and written a chunk at a time
+def write_text_line(line):
+    text_chunk.append(line)
+    if len(text_chunk) == text_chunk_size:
+        flush_text_output()
+
+
+def flush_text_output():
+    if len(text_chunk) == 0:
+        return
+    text_chunk.append("")
+    data = "\n".join(text_chunk)
+    text_chunk.clear()
+    out = getattr(sys.stdout, "buffer", None)
+    try:
+        if out is None:
+            sys.stdout.write(data)
+            return
+        if os.linesep != "\n":
+            data = data.replace("\n", os.linesep)  # like the newline translation of the text stdout
+        sys.stdout.flush()
+        out.write(data.encode(sys.stdout.encoding, sys.stdout.errors))
+    except OSError as exc:
+        if exc.errno == 22: # broken pipe causes 'Invalid Argument' on windows
+            sys.stderr.close()  # dirty hack to prevent reporting any errors
+            sys.exit(1)
+        raise
+
+
+# the binary format is little-endian, see binary_header
+def to_little_endian(values):
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_little_endian(stream, typecode, count):
+    values = array.array(typecode)
+    values.frombytes(read_binary_data(stream, values.itemsize * count))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def read_binary_data(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("the opencanary binary input on stdin is truncated")
+    return data
+
+
+def get_index_typecode(distinct_count):
+    if distinct_count <= 0x100:
+        return "B"
+    if distinct_count <= 0x10000:
+        return "H"
+    return "I"
+
+
+# writes the fields of a record in the binary format, as write_issue_fields() writes them
+def write_binary_fields(parts):
+    if binary_chunk_records and (len(parts) != len(binary_chunk_records[0]) or len(binary_chunk_records) == binary_chunk_size):
+        flush_binary_output()
+    binary_chunk_records.append(parts)
+
+
+# the column as binary_header describes it, every distinct value is stored (and written, see write_issue_fields()) once
+def encode_binary_column(values, strip):
+    distinct = list(dict.fromkeys(values))
+    written = [strip(value.replace("|", "[[pipe]]")) for value in distinct]
+    data = "".join(written).encode("utf-8", "surrogateescape")
+    chunk = [binary_column.pack(len(written), len(data)), to_little_endian(array.array("I", map(len, written))), data]
+    if len(distinct) != len(values):
+        positions = {value: index for index, value in enumerate(distinct)}
+        chunk.append(to_little_endian(array.array(get_index_typecode(len(distinct)), map(positions.__getitem__, values))))
+    return chunk
+
+
+def flush_binary_output():
+    global binary_header_written
+    if len(binary_chunk_records) == 0:
+        return
+    flush_text_output()
+    sys.stdout.flush()
+    out = sys.stdout.buffer
+    if not binary_header_written:
+        out.write(binary_header)
+        binary_header_written = True
+    field_count = len(binary_chunk_records[0])
+    chunk = [binary_chunk.pack(len(binary_chunk_records), field_count)]
+    for column, values in enumerate(zip(*binary_chunk_records)):
+        # like the line of the text format is stripped, the first and last field of the record are
+        strip = [str, str.lstrip, str.rstrip, str.strip][(column == 0) + 2 * (column == field_count - 1)]
+        chunk += encode_binary_column(values, strip)
+    binary_chunk_records.clear()
+    out.write(b"".join(chunk))
+    out.flush()
+
+
+# the last chunk is written when the stage exits
+def flush_output_at_exit():
+    try:
+        flush_text_output()
+        flush_binary_output()
+    except BrokenPipeError:
+        sys.stderr.close()
+
+
+atexit.register(flush_output_at_exit)
+
+
+# returns the distinct values of a column and per record the index of its value, None when they are in record order
+def decode_binary_column(stream, record_count):
+    distinct_count, size = binary_column.unpack(read_binary_data(stream, binary_column.size))
+    ends = list(itertools.accumulate(read_little_endian(stream, "I", distinct_count)))
+    text = read_binary_data(stream, size).decode("utf-8", "surrogateescape")
+    distinct = list(map(text.__getitem__, map(slice, [0] + ends[:-1], ends)))
+    if distinct_count == record_count:
+        return distinct, None
+    return distinct, read_little_endian(stream, get_index_typecode(distinct_count), record_count)
+
+
+# the values of a column in record order
+def get_binary_values(distinct, indices):
+    if indices is None:
+        return distinct
+    return map(distinct.__getitem__, indices)
+
+
+# yields the columns of every chunk, as (distinct values, index per record or None) per column
+def read_binary_chunks(stream):
+    if stream.read(len(binary_header)) != binary_header:
+        raise ValueError("stdin starts with a null character, but is not in the opencanary binary format")
+    while True:
+        data = stream.read(binary_chunk.size)
+        if len(data) == 0:
+            return
+        if len(data) != binary_chunk.size:
+            raise ValueError("the opencanary binary input on stdin is truncated")
+        record_count, field_count = binary_chunk.unpack(data)
+        yield [decode_binary_column(stream, record_count) for _ in range(field_count)]
+
+
+def read_binary_fields(stream):
+    for columns in read_binary_chunks(stream):
+        values = [get_binary_values(distinct, indices) for distinct, indices in columns]
+        yield from map(list, zip(*values))
+
+
+# like read_binary_fields() followed by read_issue_fields(), the quotes are removed once per distinct value
+def read_binary_issues(stream):
+    for columns in read_binary_chunks(stream):
+        values = [get_binary_values(list(map(string_sql_escaping_word, distinct)), indices) for distinct, indices in columns]
+        if len(columns) == len(Column):
+            yield from map(Issue, *values)
+            continue
+        for parts in map(list, zip(*values)):
+            check_structured_line_parts(parts)
+            yield parts
+
+
+# returns the binary stdin when it is in the binary format, None for text
+def get_binary_stdin():
+    stream = getattr(sys.stdin, "buffer", None)
+    if stream is not None and hasattr(stream, "peek") and stream.peek(1)[:1] == binary_header[:1]:
+        return stream
+    return None
+
+
+# yields the fields of the issues on stdin as the previous stage wrote them, the format (text or bin) is detected
+def read_written_fields():
+    stream = get_binary_stdin()
+    if stream is not None:
+        return read_binary_fields(stream)
+    return (line.strip().split("|") for line in sys.stdin)
+
+
+# writes the fields in the output_format, a next stage reads the fields of the line they are joined into
+def write_written_fields(parts):
+    line = "|".join(parts)
+    if output_format == "bin":
+        # only a part that holds a | is split like the text line would be
+        write_binary_fields(parts if line.count("|") == len(parts) - 1 else line.split("|"))
+        return
+    write_text_line(line)
+
+
+# yields the issues on stdin, like read_structured_line() for every line, the format (text or bin) is detected
+def read_issues():
+    stream = get_binary_stdin()
+    if stream is not None:
+        return read_binary_issues(stream)
+    return map(read_structured_line, sys.stdin)
 
 
 class KeyNotInEnvironmentFile:
@@ -137,6 +632,7 @@ def eprint(*args, **kwargs):
 
 def sprint(*args, **kwargs):
     try:
+        flush_text_output()
         print(*args, file=sys.stdout, **kwargs)
     except OSError as exc:
         if exc.errno == 22: # broken pipe causes 'Invalid Argument' on windows
@@ -181,19 +677,46 @@ def get_timestamp():
     return now.strftime("%H:%M:%S.%f")[:12]
 
 
-def get_cpp_files_from_directory(path):
-    rootpath = os.path.abspath(path)
+def split_cpp_files(filenames):
     headers = []
     cpps = []
+    for filename in filenames:
+        if filename.endswith(".h") or filename.endswith(".hpp"):
+            headers += [filename]
+        if filename.endswith(".cpp") or filename.endswith(".cc"):
+            cpps += [filename]
+    return headers, cpps
+
 
-    for root, _dirs, files in gitignore_parser.walk(rootpath, filenames=['.opencanaryignore']):
+# returns the absolute paths of the files below 'path' that the 'ignore_files' do not ignore.
+# When an inventory index is configured (see inventory.py) it is refreshed and used instead of walking the tree
+def get_files_from_directory(path, ignore_files=['.opencanaryignore'], index_filename=None):
+    rootpath = os.path.abspath(path)
+    if index_filename is None:
+        index_filename = os.environ.get("OPENCANARY_INVENTORY", "")
+    if index_filename:
+        import inventory  # imported here because inventory uses util
+        return inventory.get_files_from_index(index_filename, rootpath, ignore_files)
+
+    filenames = []
+    for root, _dirs, files in gitignore_parser.walk_parallel(rootpath, filenames=ignore_files):
         for file in files:
-            filename = os.path.abspath(os.path.join(root, file))
-            if file.endswith(".h") or file.endswith(".hpp"):
-                headers += [filename]
-            if file.endswith(".cpp") or file.endswith(".cc"):
-                cpps += [filename]
-    return headers, cpps
+            filenames += [os.path.abspath(os.path.join(root, file))]
+    return filenames
+
+
+def get_cpp_files_from_directory(path):
+    return split_cpp_files(get_files_from_directory(path))
+
+
+# returns the files that changed compared to 'ref' and are not ignored by .opencanaryignore
+# 'ref' is passed to 'git diff' as is, so 'origin/main...' (changes since the merge-base) also works
+def get_changed_files_from_directory(path, ref):
+    rootpath = os.path.abspath(path)
+    command = ["git", "diff", "--name-only", "--relative", "--diff-filter=d", "-z", ref, "--"]
+    git_result = subprocess.run(command, check=True, cwd=rootpath, stdout=subprocess.PIPE)
+    changed = [name for name in git_result.stdout.decode("utf-8").split("\0") if name != ""]
+    return gitignore_parser.filter_paths(rootpath, changed, filenames=['.opencanaryignore'])
 
 
 def get_include_file(line):